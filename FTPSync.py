@@ -39,17 +39,21 @@ import sublime_plugin
 # Python's built-in libraries
 import shutil
 import os
+import collections
 import hashlib
 import json
 import threading
 import re
-import copy
 import traceback
 import sys
+import time
 
 # FTPSync libraries
-from ftpsyncwrapper import CreateConnection, TargetAlreadyExists
+from ftpsyncwrapper import CreateConnection, TargetAlreadyExists, resolveHost
 from ftpsyncprogress import Progress
+from ftpsyncpool import ConnectionPool, CircuitBreaker, ConcurrencyController, KeepAliveScheduler, PoolExhaustedException, CircuitOpenException
+from ftpsyncworkers import runConcurrently, WorkerPool
+from ftpsyncmanifest import getManifest
 from ftpsyncfiles import getFolders, findFile, getFiles, formatTimestamp, gatherMetafiles, getChangedFiles
 
 
@@ -78,6 +82,8 @@ ignore = settings.get('ignore')
 time_format = settings.get('time_format')
 # delay before check of right opened file is performed, cancelled if closed in the meantime
 download_on_open_delay = settings.get('download_on_open_delay')
+# period of sending keep-alive to idle connections [seconds]
+keep_alive_interval = settings.get('keep_alive_interval')
 
 # loaded project's config will be merged with this global one
 coreConfig = {
@@ -100,6 +106,14 @@ configName = 'ftpsync.settings'
 connectionDefaultsFilename = 'ftpsync.default-settings'
 # timeout for a Sublime status bar messages [ms]
 messageTimeout = 250
+# maximum number of remotes being connected to simultaneously
+connectConcurrency = 8
+# maximum wait for a free session when on the UI thread (check before save) [seconds]
+uiCheckoutTimeout = 0
+# maximum wait for a free session in batch transfers [seconds], -1 = until some is returned
+batchCheckoutTimeout = -1
+# name of a file storing discovered server session limits
+limitsFilename = 'FTPSync.limits'
 # comment removing regexp
 removeLineComment = re.compile('//.*', re.I)
 # deprecated names
@@ -108,14 +122,22 @@ deprecatedNames = {
 }
 
 
-# connection cache pool - all connections
+# connection cache pool - endpoint (host, port, user...) => ConnectionPool
 connections = {}
-# connections currently marked as {in use}
-usingConnections = []
+# guards the connections pool
+connectionsLock = threading.Lock()
 # individual folder config cache, file => config path
 configs = {}
-# scheduled delayed uploads, file_path => action id
+# parsed configs, config path => (fingerprint, config)
+loadedConfigs = {}
+# compiled per-remote ignore patterns, pattern => regexp
+ignorePatterns = {}
+# scheduled delayed uploads, (file_path, connection name) => action id
 scheduledUploads = {}
+# last pre-warming of connections, config file path => timestamp
+prewarmed = {}
+# discovered server session limits, pool name => limit (None = not loaded yet)
+serverLimits = None
 
 
 # ==== Generic =============================================================================
@@ -126,10 +148,16 @@ def isString(var):
     return var_type is str or var_type is unicode
 
 # Dumps the exception to console
+#
+# @type  exception: Exception|tuple
+# @param exception: exception or exc_info tuple caught in another thread
 def handleException(exception):
     print "FTPSync > Exception in user code:"
     print '-' * 60
-    traceback.print_exc(file=sys.stdout)
+    if type(exception) is tuple:
+        traceback.print_exception(exception[0], exception[1], exception[2], file=sys.stdout)
+    else:
+        traceback.print_exc(file=sys.stdout)
     print '-' * 60
 
 
@@ -262,24 +290,16 @@ def getFilepathHash(file_path):
     return hashlib.md5(file_path).hexdigest()
 
 
-# Returns hash of configuration contents
+# Returns fingerprint of a config file, changes whenever the file is modified
 #
-# @type config: dict
+# @type  file_path: string
+# @param file_path: file path to the config file
 #
 # @return string
-#
-# @link http://stackoverflow.com/a/8714242/387503
-def getObjectHash(o):
-    if isinstance(o, set) or isinstance(o, tuple) or isinstance(o, list):
-        return tuple([getObjectHash(e) for e in o])
-    elif not isinstance(o, dict):
-        return hash(o)
-
-    new_o = copy.deepcopy(o)
-    for k, v in new_o.items():
-        new_o[k] = getObjectHash(v)
+def getConfigFingerprint(file_path):
+    stat = os.stat(file_path)
 
-    return hash(tuple(frozenset(new_o.items())))
+    return hashlib.md5(file_path + "|" + repr(stat.st_mtime) + "|" + str(stat.st_size)).hexdigest()
 
 
 # Updates deprecated config to newer version
@@ -316,7 +336,7 @@ def verifyConfig(config):
     if type(config) is not dict:
         return "Config is not a {dict} type"
 
-    keys = ["username", "password", "private_key", "private_key_pass", "path", "tls", "upload_on_save", "port", "timeout", "ignore", "check_time", "download_on_open", "upload_delay", "after_save_watch","time_offset"]
+    keys = ["username", "password", "private_key", "private_key_pass", "path", "tls", "upload_on_save", "port", "timeout", "ignore", "check_time", "download_on_open", "upload_delay", "after_save_watch","time_offset", "max_connections", "retry_attempts", "retry_delay", "circuit_breaker_threshold", "circuit_breaker_cooldown", "transfer_block_size", "listing_cache_ttl"]
 
     for key in keys:
         if key not in config:
@@ -370,6 +390,27 @@ def verifyConfig(config):
     if type(config['time_offset']) is not int and type(config['time_offset']) is not long:
         return "Config entry 'time_offset' must be an integer or long, " + unicode(type(config['time_offset'])) + " given"
 
+    if type(config['max_connections']) is not int and type(config['max_connections']) is not long:
+        return "Config entry 'max_connections' must be an integer or long, " + unicode(type(config['max_connections'])) + " given"
+
+    if type(config['retry_attempts']) is not int and type(config['retry_attempts']) is not long:
+        return "Config entry 'retry_attempts' must be an integer or long, " + unicode(type(config['retry_attempts'])) + " given"
+
+    if type(config['retry_delay']) is not int and type(config['retry_delay']) is not long and type(config['retry_delay']) is not float:
+        return "Config entry 'retry_delay' must be a number, " + unicode(type(config['retry_delay'])) + " given"
+
+    if type(config['circuit_breaker_threshold']) is not int and type(config['circuit_breaker_threshold']) is not long:
+        return "Config entry 'circuit_breaker_threshold' must be an integer or long, " + unicode(type(config['circuit_breaker_threshold'])) + " given"
+
+    if type(config['circuit_breaker_cooldown']) is not int and type(config['circuit_breaker_cooldown']) is not long:
+        return "Config entry 'circuit_breaker_cooldown' must be an integer or long, " + unicode(type(config['circuit_breaker_cooldown'])) + " given"
+
+    if type(config['transfer_block_size']) is not int and type(config['transfer_block_size']) is not long:
+        return "Config entry 'transfer_block_size' must be an integer or long, " + unicode(type(config['transfer_block_size'])) + " given"
+
+    if type(config['listing_cache_ttl']) is not int and type(config['listing_cache_ttl']) is not long:
+        return "Config entry 'listing_cache_ttl' must be an integer or long, " + unicode(type(config['listing_cache_ttl'])) + " given"
+
     return True
 
 
@@ -394,16 +435,72 @@ def parseJson(file_path):
     return json.loads(contents)
 
 
+# Returns a config that can be modified by a command (its list of remotes filtered)
+# without affecting the cached one
+#
+# @type  config: dict
+#
+# @return dict
+def copyConfig(config):
+    return dict(config.items() + [("connections", dict(config['connections']))])
+
+
+# Returns compiled ignore pattern of a remote
+#
+# @type  pattern: string
+#
+# @return regexp
+#
+# @global ignorePatterns
+def getIgnorePattern(pattern):
+    if pattern not in ignorePatterns:
+        ignorePatterns[pattern] = re.compile(pattern)
+
+    return ignorePatterns[pattern]
+
+
+# Returns parsed config with defaults, parses it only when changed since the last call
+#
+# @type  file_path: string
+# @param file_path: file path to the config file
+#
+# @return config dict or None
+#
+# @global loadedConfigs
+def loadConfig(file_path):
+    try:
+        fingerprint = getConfigFingerprint(file_path)
+    except OSError:
+        loadedConfigs.pop(file_path, None)
+        return None
+
+    cached = loadedConfigs.get(file_path)
+    if cached is not None and cached[0] == fingerprint:
+        return copyConfig(cached[1])
+
+    config = parseConfig(file_path, fingerprint)
+
+    if config is None:
+        loadedConfigs.pop(file_path, None)
+        return None
+
+    loadedConfigs[file_path] = (fingerprint, config)
+
+    return copyConfig(config)
+
+
 # Parses given config and adds default values to each connection entry
 #
 # @type  file_path: string
-# @param file_path: file path to the file of which we want the hash
+# @param file_path: file path to the config file
+# @type  fingerprint: string
+# @param fingerprint: fingerprint of the config file
 #
 # @return config dict or None
 #
 # @global coreConfig
 # @global projectDefaults
-def loadConfig(file_path):
+def parseConfig(file_path, fingerprint):
     if os.path.exists(file_path) is False:
         return None
 
@@ -439,167 +536,423 @@ def loadConfig(file_path):
             printMessage("Invalid configuration loaded: <" + unicode(verification_result) + ">", status=True)
 
     # merge with generics
-    final = dict(coreConfig + {"connections": result}.items())
+    final = dict(coreConfig + {"connections": result, "fingerprint": fingerprint}.items())
 
     return final
 
 
 # ==== Remote =============================================================================
 
-# Returns connection, connects if needed
+# Opens a new session to a remote: connects, authenticates, logs in and sets initial path
+#
+# @type  config: object
+# @param config: configuration object
+# @type  name: string
+# @param name: connection name from config
+#
+# @return descendant of AbstractConnection (ftpsyncwrapper.py)
+#
+# @throws Exception when any of the steps fails
+def openConnection(config, name):
+    properties = config['connections'][name]
+
+    # 1. initialize
+    try:
+        connection = CreateConnection(config, name)
+    except Exception, e:
+        printMessage("Connection initialization failed <Exception: " + stringifyException(e) + ">", name, status=True)
+        raise
+
+    try:
+        # 2. connect
+        try:
+            connection.connect()
+        except Exception, e:
+            printMessage("Connection failed <Exception: " + stringifyException(e) + ">", name, status=True)
+            raise
+
+        printMessage("Connected to: " + properties['host'] + ":" + unicode(properties['port']) + " (timeout: " + unicode(properties['timeout']) + ")", name)
+
+        # 3. authenticate
+        try:
+            if connection.authenticate():
+                printMessage("Authentication processed", name)
+        except Exception, e:
+            printMessage("Authentication failed <Exception: " + stringifyException(e) + ">", name, status=True)
+            raise
+
+        # 4. login
+        if properties['username'] is not None:
+            try:
+                connection.login()
+            except Exception, e:
+                printMessage("Login failed <Exception: " + stringifyException(e) + ">", name, status=True)
+                raise
+
+            pass_present = " (using password: NO)"
+            if len(properties['password']) > 0:
+                pass_present = " (using password: YES)"
+
+            printMessage("Logged in as: " + properties['username'] + pass_present, name)
+        else:
+            printMessage("Anonymous connection", name)
+
+        # 5. set initial directory
+        try:
+            connection.cwd(properties['path'])
+        except Exception, e:
+            printMessage("Failed to set path (probably connection failed) <Exception: " + stringifyException(e) + ">", name)
+            raise
+
+    except Exception:
+        connection.close()
+        raise
+
+    return connection
+
+
+# Returns identity of the server endpoint the remote connects to
+#
+# Remotes (even from different config files) with the same identity share sessions
+#
+# @type  properties: dict
+# @param properties: connection part of config
+#
+# @return tuple
+def getEndpointKey(properties):
+    return (properties['host'].lower(), int(properties['port']), properties['username'], properties['tls'], properties['passive'])
+
+
+# Returns identity of the remote folder files are uploaded into
+#
+# Remotes re-pointed to another server or path don't share records of uploaded files
+#
+# @type  properties: dict
+# @param properties: connection part of config
+#
+# @return string
+def getRemoteLocation(properties):
+    return unicode(properties['username']) + "@" + properties['host'].lower() + ":" + unicode(properties['port']) + properties['path']
+
+
+# Returns a pool of sessions for a remote's endpoint, creates it if needed
 #
-# @type  hash: string
-# @param hash: connection cache hash (config filepath hash actually)
 # @type  config: object
 # @param config: configuration object
+# @type  name: string
+# @param name: connection name from config
 #
-# @return dict of descendants of AbstractConnection (ftpsyncwrapper.py)
+# @return ConnectionPool (ftpsyncpool.py)
 #
 # @global connections
-def getConnection(hash, config):
-    # try cache
+# @global connectionsLock
+def getConnectionPool(config, name):
+    properties = config['connections'][name]
+    key = getEndpointKey(properties)
+
+    connectionsLock.acquire()
     try:
-        if connections[hash] and len(connections[hash]) > 0:
-            printMessage("Connection cache hit (key: " + hash + ")", None, True)
+        pool = connections.get(key)
+
+        if pool is None:
+            label = unicode(properties['username']) + "@" + properties['host'] + ":" + unicode(properties['port'])
+            breaker = CircuitBreaker(properties['circuit_breaker_threshold'], properties['circuit_breaker_cooldown'])
+            learned, learnedAt = getServerLimit(label)
+            controller = ConcurrencyController(properties['max_connections'], learned, lambda limit, label=label: storeServerLimit(label, limit), learnedAt)
+            pool = ConnectionPool(label, None, properties['max_connections'], breaker, controller)
+            connections[key] = pool
+        else:
+            printMessage("Connection cache hit (key: " + pool.name + ")", name, True)
 
-        if type(connections[hash]) is not list or len(connections[hash]) < len(config['connections']):
-            raise KeyError
+        # new sessions are opened using the most recent config (password might have changed)
+        pool.factory = lambda: openConnection(config, name)
+    finally:
+        connectionsLock.release()
 
-        # has config changed?
-        valid = True
-        index = 0
-        for name in config['connections']:
-            if getObjectHash(connections[hash][index].config) != getObjectHash(config['connections'][name]):
-                valid = False
+    return pool
 
-            index += 1
 
-        if valid == False:
-            for connection in connections[hash]:
-                connection.close(connections, hash)
+# Returns path of the file storing discovered server limits
+#
+# @return string
+#
+# @global limitsFilename
+def getLimitsPath():
+    return os.path.join(sublime.packages_path(), 'User', limitsFilename)
 
-            raise KeyError
 
-        # is config truly alive
-        for connection in connections[hash]:
-            if connection.isAlive() is False:
-                raise KeyError
+# Returns a previously discovered session limit of a server and time of the discovery
+#
+# @type  key: string
+# @param key: pool name
+#
+# @return tuple<int|None, float|None>
+#
+# @global serverLimits
+def getServerLimit(key):
+    global serverLimits
 
-        return connections[hash]
+    if serverLimits is None:
+        serverLimits = {}
 
-    # cache miss
-    except KeyError:
-        connections[hash] = []
+        try:
+            if os.path.exists(getLimitsPath()):
+                with open(getLimitsPath(), 'r') as limitsFile:
+                    serverLimits = json.load(limitsFile)
+        except Exception, e:
+            printMessage("Could not load server limits: " + unicode(e), status=True)
 
-        # for each config
-        for name in config['connections']:
-            properties = config['connections'][name]
+    entry = serverLimits.get(key)
 
-            # 1. initialize
-            try:
-                connection = CreateConnection(config, name)
-            except Exception, e:
-                printMessage("Connection initialization failed <Exception: " + stringifyException(e) + ">", name, status=True)
-                handleException(e)
+    # missing or stored without the time of discovery
+    if type(entry) is not dict:
+        return None, None
 
-                continue
+    return entry['limit'], entry['time']
 
-            # 2. connect
-            try:
-                connection.connect()
-            except Exception, e:
-                printMessage("Connection failed <Exception: " + stringifyException(e) + ">", name, status=True)
-                connection.close(connections, hash)
-                handleException(e)
 
-                continue
+# Remembers a discovered session limit of a server
+#
+# @type  key: string
+# @param key: pool name
+# @type  limit: int
+#
+# @global serverLimits
+def storeServerLimit(key, limit):
+    previous = getServerLimit(key)[0]
 
-            printMessage("Connected to: " + properties['host'] + ":" + unicode(properties['port']) + " (timeout: " + unicode(properties['timeout']) + ") (key: " + hash + ")", name)
+    # time of discovery is refreshed even if the limit is the same
+    serverLimits[key] = {'limit': limit, 'time': time.time()}
 
-            # 3. authenticate
-            try:
-                if connection.authenticate():
-                    printMessage("Authentication processed", name)
-            except Exception, e:
-                printMessage("Authentication failed <Exception: " + stringifyException(e) + ">", name, status=True)
-                handleException(e)
+    if previous != limit:
+        printMessage("Server " + key + " allows only " + unicode(limit) + " connection(s)", status=True)
 
-                continue
+    try:
+        with open(getLimitsPath(), 'w') as limitsFile:
+            json.dump(serverLimits, limitsFile)
+    except Exception, e:
+        printMessage("Could not store server limits: " + unicode(e), status=True)
 
-            # 4. login
-            if properties['username'] is not None:
-                try:
-                    connection.login()
-                except Exception, e:
-                    printMessage("Login failed <Exception: " + stringifyException(e) + ">", name, status=True)
-                    handleException(e)
 
-                    continue
+# Returns all existing pools
+#
+# @return list<ConnectionPool>
+#
+# @global connections
+def getConnectionPools():
+    connectionsLock.acquire()
+    try:
+        return connections.values()
+    finally:
+        connectionsLock.release()
 
-                pass_present = " (using password: NO)"
-                if len(properties['password']) > 0:
-                    pass_present = " (using password: YES)"
 
-                printMessage("Logged in as: " + properties['username'] + pass_present, name)
-            else:
-                printMessage("Anonymous connection", name)
+# keeps idle connections alive and closes those unused for longer than connection_timeout
+keepAliveScheduler = KeepAliveScheduler(getConnectionPools, keep_alive_interval or 0, settings.get('connection_timeout'))
+keepAliveScheduler.start()
 
-            # 5. set initial directory, set name, store connection
-            try:
-                connection.cwd(properties['path'])
-            except Exception, e:
-                printMessage("Failed to set path (probably connection failed) <Exception: " + stringifyException(e) + ">", name)
-                handleException(e)
 
+# Binds a checked out (possibly shared) session to the remote of given config
+# and moves it to the remote's path
+#
+# @type  connection: AbstractConnection
+# @type  config: object
+# @param config: configuration object
+# @type  name: string
+# @param name: connection name from config
+def bindConnection(connection, config, name):
+    properties = config['connections'][name]
+
+    if connection.getBinding() != (config['fingerprint'], name):
+        connection.bind(properties, config, name)
+
+    if connection.getWorkingDirectory() != properties['path']:
+        connection.cwd(properties['path'])
+
+
+# Checks out a session for each remote in config, connects if needed
+#
+# Missing sessions are opened concurrently first, then checked out in the order
+# of remotes, remotes that failed to connect are left out
+#
+# Remotes sharing an endpoint (same account, different paths) get the same session,
+# so that a pool is never waited for while holding one of its sessions
+#
+# @type  config: object
+# @param config: configuration object
+# @type  timeout: None|int|float
+# @param timeout: maximum wait for a free session [seconds], None = remote's timeout, -1 = until some is returned
+#
+# @return dict<name => descendant of AbstractConnection (ftpsyncwrapper.py)>
+#
+# @global connectConcurrency
+def getConnection(config, timeout=None):
+    names = list(config['connections'])
+    pools = [getConnectionPool(config, name) for name in names]
+    failed = []
+
+    # open missing sessions in parallel
+    prepared = runConcurrently([pool.prepare for pool in pools], connectConcurrency)
+    for index in range(len(names)):
+        error = prepared[index][1]
+
+        if error is None:
+            continue
+
+        if error[0] is CircuitOpenException:
+            printMessage("Skipping unreachable remote <Exception: " + stringifyException(error[1]) + ">", names[index], status=True)
+        else:
+            handleException(error)
+
+        failed.append(names[index])
+
+    result = {}
+    # sessions by pool, None = checkout failed
+    checkedOut = {}
+
+    for index in range(len(names)):
+        name = names[index]
+        pool = pools[index]
+
+        if name in failed:
+            continue
+
+        if pool in checkedOut:
+            connection = checkedOut[pool]
+
+            if connection is None:
                 continue
+        else:
+            connection = checkoutConnection(pool, config, name, timeout)
+            checkedOut[pool] = connection
 
-            # 6. add to connectins list
-            present = False
-            for con in connections[hash]:
-                if con.name == connection.name:
-                    present = True
+            if connection is None:
+                continue
 
-            if present is False:
-                connections[hash].append(connection)
+        try:
+            bindConnection(connection, config, name)
+        except Exception, e:
+            printMessage("Failed to set path (probably connection failed) <Exception: " + stringifyException(e) + ">", name, status=True)
+            handleException(e)
 
-        # schedule connection timeout
-        def closeThisConnection():
-            if hash not in usingConnections:
-                closeConnection(hash)
-            else:
-                sublime.set_timeout(closeThisConnection, config['connection_timeout'] * 1000)
+            # still used by other remotes
+            if connection in result.values():
+                continue
 
-        sublime.set_timeout(closeThisConnection, config['connection_timeout'] * 1000)
+            connection.close()
+            pool.checkin(connection)
+            checkedOut[pool] = None
+            continue
 
-        # return all connections
-        return connections[hash]
+        result[name] = connection
 
+    return result
 
-# Close all connections for a given config file
+
+# Checks out a session from a pool, reports failures
 #
-# @type  hash: string
-# @param hash: connection cache hash (config filepath hash actually)
+# @type  pool: ConnectionPool
+# @type  config: object
+# @param config: configuration object
+# @type  name: string
+# @param name: connection name from config
+# @type  timeout: None|int|float
+# @param timeout: maximum wait for a free session [seconds], None = remote's timeout, -1 = until some is returned
 #
-# @global connections
-def closeConnection(hash):
-    if isString(hash) is False:
-        printMessage("Error closing connection: connection hash must be a string, " + unicode(type(hash)) + " given")
-        return
+# @return AbstractConnection|None
+def checkoutConnection(pool, config, name, timeout):
+    wait = timeout
+    if wait is None:
+        wait = config['connections'][name]['timeout']
+    elif wait < 0:
+        wait = None
+
+    try:
+        return pool.checkout(wait)
+    except PoolExhaustedException, e:
+        printMessage("No free connection <Exception: " + stringifyException(e) + ">", name, status=True)
+    except CircuitOpenException, e:
+        printMessage("Skipping unreachable remote <Exception: " + stringifyException(e) + ">", name, status=True)
+    except Exception, e:
+        handleException(e)
+
+    return None
 
-    if hash not in connections:
+
+# Opens sessions in advance for remotes likely to be used soon
+# (those uploading on save or checking on open) and resolves their hosts
+#
+# @type  config_file_path: string
+# @param config_file_path: path to the config file
+#
+# @global connectConcurrency
+def prewarmConnection(config_file_path):
+    config = loadConfig(config_file_path)
+    if config is None:
         return
 
+    names = []
+    jobs = []
+
+    for name in config['connections']:
+        properties = config['connections'][name]
+
+        if properties['upload_on_save'] is False and properties['download_on_open'] is False:
+            continue
+
+        pool = getConnectionPool(config, name)
+
+        def job(properties=properties, pool=pool):
+            resolveHost(properties['host'], properties['port'])
+            return pool.prepare()
+
+        names.append(name)
+        jobs.append(job)
+
+    results = runConcurrently(jobs, connectConcurrency)
+
+    for index in range(len(names)):
+        if results[index][1] is not None:
+            printMessage("Pre-warming failed <Exception: " + stringifyException(results[index][1][1]) + ">", names[index], True)
+        elif results[index][0] is True:
+            printMessage("Pre-warmed connection", names[index], True)
+
+
+# Returns a checked out session back to its pool
+#
+# @type  connection: AbstractConnection
+#
+# @global connections
+def releaseConnection(connection):
+    connectionsLock.acquire()
     try:
-        for connection in connections[hash]:
-            connection.close(connections, hash)
-            printMessage("closed", connection.name)
+        pool = connections.get(getEndpointKey(connection.config))
+    finally:
+        connectionsLock.release()
 
-        if len(connections[hash]) == 0:
-            connections.pop(hash)
+    if pool is not None:
+        pool.checkin(connection)
+    else:
+        connection.close()
 
-    except Exception, e:
-        printMessage("Error when closing connection (key: " + hash + ") <Exception: " + stringifyException(e) + ">")
-        handleException(e)
+
+# Returns a note about retries and resuming of the last connection's action (to be appended to a message)
+#
+# @type  connection: AbstractConnection
+#
+# @return string
+def getRetriesNote(connection):
+    note = ""
+
+    retries = connection.getLastRetries()
+    if retries > 0:
+        note += " (reconnected " + unicode(retries) + "x)"
+
+    resumed = connection.getLastResumed()
+    if resumed > 0:
+        note += " (resumed at " + unicode(resumed) + " bytes)"
+
+    return note
 
 
 # Creates a process message with progress bar (to be used in status bar)
@@ -641,6 +994,7 @@ class SyncCommand(object):
         self.closed = False
         self.file_path = file_path
         self.config_file_path = config_file_path
+        self.checkoutTimeout = None
 
         if isString(config_file_path) is False:
             printMessage("Cancelling " + unicode(self.__class__.__name__) + ": invalid config_file_path given (type: " + unicode(type(config_file_path)) + ")")
@@ -650,8 +1004,11 @@ class SyncCommand(object):
         self.config = loadConfig(config_file_path)
         self.basename = os.path.relpath(file_path, os.path.dirname(config_file_path))
 
-        self.config_hash = getFilepathHash(self.config_file_path)
-        self.connections = getConnection(self.config_hash, self.config)
+        self.connections = {}
+
+    # Checks out sessions for remotes that remained after filtering
+    def _connect(self):
+        self.connections = getConnection(self.config, self.checkoutTimeout)
 
     def _localizePath(self, config, remote_path):
         path = remote_path
@@ -666,8 +1023,38 @@ class SyncCommand(object):
     def close(self):
         self.closed = True
 
-    def _closeConnection(self):
-        closeConnection(getFilepathHash(self.config_file_path))
+    # Returns the session of a remote bound to it, remotes on the same account share one
+    def _getConnection(self, name):
+        connection = self.connections[name]
+        bindConnection(connection, self.config, name)
+
+        return connection
+
+    # Closes a terminated session so that the pool replaces it
+    def _closeConnection(self, name):
+        if name in self.connections:
+            self.connections[name].close()
+            self._releaseConnection(name)
+
+    # Returns a checked out session back to the pool once no other remote uses it
+    def _releaseConnection(self, name):
+        if name in self.connections:
+            connection = self.connections.pop(name)
+
+            if connection not in self.connections.values():
+                releaseConnection(connection)
+
+    # Returns all checked out sessions back to the pool
+    def _releaseConnections(self):
+        if hasattr(self, 'connections'):
+            for name in list(self.connections):
+                self._releaseConnection(name)
+
+    # Limits waiting for sessions held by other commands, None = remote's timeout, -1 = until some is returned
+    def setCheckoutTimeout(self, timeout):
+        self.checkoutTimeout = timeout
+
+        return self
 
     def whitelistConnections(self, whitelistConnections):
         toBeRemoved = []
@@ -681,8 +1068,7 @@ class SyncCommand(object):
         return self
 
     def __del__(self):
-        if hasattr(self, 'config_hash') and self.config_hash in usingConnections:
-            usingConnections.remove(self.config_hash)
+        self._releaseConnections()
 
 
 # Transfer-related sychronization command
@@ -712,7 +1098,7 @@ class SyncCommandTransfer(SyncCommand):
                 continue
 
             # ignore
-            if disregardIgnore is False and self.config['connections'][name]['ignore'] is not None and re.search(self.config['connections'][name]['ignore'], file_path):
+            if disregardIgnore is False and self.config['connections'][name]['ignore'] is not None and getIgnorePattern(self.config['connections'][name]['ignore']).search(file_path):
                 printMessage("file ignored by rule: {" + self.basename + "}", name, True)
                 toBeRemoved.append(name)
                 continue
@@ -734,6 +1120,12 @@ class SyncCommandUpload(SyncCommandTransfer):
 
         self.delayed = False
         self.afterwatch = None
+        self.skipUnchanged = False
+
+    def setSkipUnchanged(self):
+        self.skipUnchanged = True
+
+        return self
 
 
     def scanWatched(self, event, name, properties):
@@ -765,40 +1157,55 @@ class SyncCommandUpload(SyncCommandTransfer):
                 'after': {}
             }
 
-            index = -1
-
             for name in self.config['connections']:
-                index += 1
                 self.scanWatched('before', name, self.config['connections'][name])
 
-        usingConnections.append(self.config_hash)
+        manifest = getManifest(os.path.dirname(self.config_file_path))
+
+        # same as last uploaded, no need to even connect
+        if self.skipUnchanged is True:
+            skipped = []
+
+            for name in list(self.config['connections']):
+                if manifest.isUnchanged(getRemoteLocation(self.config['connections'][name]), self.file_path):
+                    self.config['connections'].pop(name)
+                    skipped.append(name)
+                    printMessage("unchanged, skipped {" + self.basename + "}", name, True)
+
+            if len(self.config['connections']) == 0:
+                dumpMessage(getProgressMessage(skipped, self.progress, "unchanged, skipped", self.basename))
+                return
+
         stored = []
-        index = -1
+        immediate = []
+        self._connect()
 
         for name in self.config['connections']:
-            index += 1
+            if name not in self.connections:
+                continue
 
             try:
                 # identification
-                connection = self.connections[index]
                 id = os.urandom(32)
-                scheduledUploads[self.file_path] = id
+                scheduledUploads[(self.file_path, name)] = id
 
                 # action
-                def action():
+                def action(name=name, id=id):
                     try:
 
                         # cancelled
-                        if scheduledUploads[self.file_path] != id:
+                        if scheduledUploads[(self.file_path, name)] != id:
                             return
 
                         # process
-                        connection.put(self.file_path)
+                        self._getConnection(name).put(self.file_path)
                         stored.append(name)
-                        printMessage("uploaded {" + self.basename + "}", name)
+                        manifest.record(getRemoteLocation(self.config['connections'][name]), self.file_path, self.connections[name].getLastSent())
+                        printMessage("uploaded {" + self.basename + "}" + getRetriesNote(self.connections[name]), name)
 
                         # cleanup
-                        scheduledUploads.pop(self.file_path)
+                        scheduledUploads.pop((self.file_path, name))
+                        self._releaseConnection(name)
 
                         if self.delayed is True:
                             # afterwatch
@@ -810,14 +1217,20 @@ class SyncCommandUpload(SyncCommandTransfer):
                                 SyncCommandUpload(change, getConfigFile(change), None, False, True, [name]).execute()
 
                             self.delayed = False
-                            self.__del__()
 
                         # no need to handle progress, delay action only happens with single uploads
 
+                    except EOFError:
+                        printMessage("Connection has been terminated, please retry your action", name, False, True)
+                        self._closeConnection(name)
+
                     except Exception, e:
                         printMessage("upload failed: {" + self.basename + "} <Exception: " + stringifyException(e) + ">", name, False, True)
                         handleException(e)
 
+                    finally:
+                        self._releaseConnection(name)
+
 
                 # delayed
                 if self.onSave is True and self.config['connections'][name]['upload_delay'] > 0:
@@ -825,26 +1238,28 @@ class SyncCommandUpload(SyncCommandTransfer):
                     printMessage("delaying upload of " + self.basename + " by " + unicode(self.config['connections'][name]['upload_delay']) + " seconds", name, onlyVerbose=True)
                     sublime.set_timeout(action, self.config['connections'][name]['upload_delay'] * 1000)
                 else:
-                    action()
-
-            except IndexError:
-                continue
-
-            except EOFError:
-                printMessage("Connection has been terminated, please retry your action", name, False, True)
-                self._closeConnection()
+                    immediate.append((self.connections[name], action))
 
             except Exception, e:
                 printMessage("upload failed: {" + self.basename + "} <Exception: " + stringifyException(e) + ">", name, False, True)
                 handleException(e)
 
+        # all sessions at once, remotes sharing one take turns on it, each action handles its own errors
+        chains = []
+        for connection, action in immediate:
+            for chain in chains:
+                if chain[0] is connection:
+                    chain[1].append(action)
+                    break
+            else:
+                chains.append((connection, [action]))
+
+        runConcurrently([lambda actions=actions: [action() for action in actions] for connection, actions in chains], len(chains))
+        stored = [name for name in self.config['connections'] if name in stored]
+
         if len(stored) > 0:
             dumpMessage(getProgressMessage(stored, self.progress, "uploaded", self.basename))
 
-    def __del__(self):
-        if self.delayed is False:
-            SyncCommand.__del__(self)
-
 
 # Download command
 class SyncCommandDownload(SyncCommandTransfer):
@@ -855,6 +1270,7 @@ class SyncCommandDownload(SyncCommandTransfer):
         self.isDir = False
         self.forced = False
         self.skip = False
+        self.remoteSize = None
 
     def setIsDir(self):
         self.isDir = True
@@ -871,6 +1287,24 @@ class SyncCommandDownload(SyncCommandTransfer):
 
         return self
 
+    # Remote size known from a listing, spares asking the server before downloading
+    def setRemoteSize(self, size):
+        self.remoteSize = size
+
+        return self
+
+    # Downloads a listed file of the folder being downloaded
+    def _downloadEntry(self, full_name, skip, size):
+        command = SyncCommandDownload(full_name, self.config_file_path, progress=self.progress, disregardIgnore=self.disregardIgnore)
+        command.setCheckoutTimeout(batchCheckoutTimeout).setRemoteSize(size)
+
+        if self.forced:
+            command.setForced()
+        elif skip:
+            command.setSkip()
+
+        command.execute()
+
     def execute(self):
         self.forced = True
 
@@ -885,63 +1319,88 @@ class SyncCommandDownload(SyncCommandTransfer):
             printMessage("Cancelling " + unicode(self.__class__.__name__) + ": zero connections apply")
             return
 
-        usingConnections.append(self.config_hash)
-        index = -1
         stored = []
+        self._connect()
 
         for name in self.config['connections']:
-            index += 1
+            if name not in self.connections:
+                continue
 
             try:
                 if self.isDir or os.path.isdir(self.file_path):
                     file_path = self._localizePath(self.config['connections'][name], self.file_path)
 
-                    contents = self.connections[index].list(file_path)
-
                     if os.path.exists(file_path) is False:
                         os.mkdir(file_path)
 
-                    for entry in contents:
-                        if entry.isDirectory() is False:
-                            self.progress.add([entry.getName()])
+                    # files are downloaded using other sessions while the listing is still arriving,
+                    # folders are descended into once it's finished
+                    folders = []
+                    pending = collections.deque()
+                    workers = WorkerPool(getConfigConcurrency(self.config))
+                    listing = self._getConnection(name).iterList(file_path, self.forced)
+
+                    try:
+                        for entry in listing:
+                            full_name = os.path.join(file_path, entry.getName())
+
+                            if entry.isDirectory() is True:
+                                folders.append(full_name)
+                                continue
+
+                            if self.progress is not None:
+                                self.progress.add([entry.getName()])
+
+                            # only what's needed to create the command once a worker takes it
+                            pending.append((full_name, self.forced is False and entry.isNewerThan(full_name) is True, entry.getFilesize()))
+
+                            # never waits for workers while holding a session they might need
+                            while len(pending) > 0 and workers.offer(lambda item=pending[0]: self._downloadEntry(*item)):
+                                pending.popleft()
+                    finally:
+                        listing.close()
 
-                    for entry in contents:
-                        full_name = os.path.join(file_path, entry.getName())
+                        # descendants check out their own sessions
+                        self._releaseConnections()
 
-                        command = SyncCommandDownload(full_name, self.config_file_path, progress=self.progress, disregardIgnore=self.disregardIgnore)
+                        # the session is free, waiting for workers keeps the rest bounded
+                        while len(pending) > 0:
+                            item = pending.popleft()
+                            workers.submit(lambda item=item: self._downloadEntry(*item))
+
+                        for error in workers.join():
+                            handleException(error)
+
+                    for full_name in folders:
+                        command = SyncCommandDownload(full_name, self.config_file_path, progress=self.progress, disregardIgnore=self.disregardIgnore).setIsDir()
+                        command.setCheckoutTimeout(batchCheckoutTimeout)
 
                         if self.forced:
                             command.setForced()
 
-                        if entry.isDirectory() is True:
-                            command.setIsDir()
-                        elif not self.forced and entry.isNewerThan(full_name) is True:
-                            command.setSkip()
-
                         command.execute()
 
                     return
 
                 else:
                     if not self.skip or self.forced:
-                        self.connections[index].get(self.file_path)
-                        printMessage("downloaded {" + self.basename + "}", name)
+                        self._getConnection(name).get(self.file_path, self.remoteSize)
+                        printMessage("downloaded {" + self.basename + "}" + getRetriesNote(self.connections[name]), name)
                     else:
                         printMessage("skipping {" + self.basename + "}", name)
 
                     stored.append(name)
 
-            except IndexError:
-                continue
-
             except EOFError:
                 printMessage("Connection has been terminated, please retry your action", name, False, True)
-                self._closeConnection()
+                self._closeConnection(name)
 
             except Exception, e:
                 printMessage("download of {" + self.basename + "} failed <Exception: " + stringifyException(e) + ">", name, False, True)
                 handleException(e)
 
+        self._releaseConnections()
+
         if len(stored) > 0:
             dumpMessage(getProgressMessage(stored, self.progress, "downloaded", self.basename))
 
@@ -973,45 +1432,53 @@ class SyncCommandRename(SyncCommand):
             printMessage("Cancelling " + unicode(self.__class__.__name__) + ": zero connections apply")
             return
 
-        usingConnections.append(self.config_hash)
-        index = -1
         renamed = []
+        self._connect()
 
         exists = []
         remote_new_name = os.path.join( os.path.split(self.file_path)[0], self.new_name)
-        for name in self.config['connections']:
-            index += 1
+        for name in list(self.connections):
+            try:
+                # the new name does not exist locally yet, probing is only reliable for files
+                if os.path.isdir(self.file_path):
+                    check = self._getConnection(name).list(remote_new_name)
+                else:
+                    check = self._getConnection(name).probe(remote_new_name)
 
-            check = self.connections[index].list(remote_new_name)
+                if type(check) is list and len(check) > 0:
+                    exists.append(name)
 
-            if type(check) is list and len(check) > 0:
-                exists.append(name)
+            except EOFError:
+                printMessage("Connection has been terminated, please retry your action", name, False, True)
+                self._closeConnection(name)
 
-        def action(forced=False):
-            index = -1
+            except Exception, e:
+                printMessage("checking {" + self.new_name + "} failed <Exception: " + stringifyException(e) + ">", name, False, True)
+                handleException(e)
 
+        def action(forced=False):
             for name in self.config['connections']:
-                index += 1
+                if name not in self.connections:
+                    continue
 
                 try:
-                    self.connections[index].rename(self.file_path, self.new_name, forced)
+                    self._getConnection(name).rename(self.file_path, self.new_name, forced)
                     printMessage("renamed {" + self.basename + "} -> {" + self.new_name + "}", name)
                     renamed.append(name)
 
-                except IndexError:
-                    continue
-
                 except TargetAlreadyExists, e:
                     printMessage(stringifyException(e))
 
                 except EOFError:
                     printMessage("Connection has been terminated, please retry your action", name, False, True)
-                    self._closeConnection()
+                    self._closeConnection(name)
 
                 except Exception, e:
                     printMessage("renaming failed: {" + self.basename + "} -> {" + self.new_name + "} <Exception: " + stringifyException(e) + ">", name, False, True)
                     handleException(e)
 
+            self._releaseConnections()
+
             # rename file
             os.rename(self.file_path, os.path.join(self.dirname, self.new_name))
 
@@ -1029,6 +1496,7 @@ class SyncCommandRename(SyncCommand):
                     action(True)
                 else:
                     printMessage("Renaming: keeping original")
+                    self._releaseConnections()
 
             items = [
                 "Such file already exists in <" + ','.join(exists) + "> - cancel rename?",
@@ -1041,6 +1509,16 @@ class SyncCommandRename(SyncCommand):
 # Rename command
 class SyncCommandGetMetadata(SyncCommand):
 
+    def __init__(self, file_path, config_file_path):
+        SyncCommand.__init__(self, file_path, config_file_path)
+
+        self.forced = False
+
+    def setForced(self):
+        self.forced = True
+
+        return self
+
     def execute(self):
         if self.closed is True:
             printMessage("Cancelling " + unicode(self.__class__.__name__) + ": command is closed")
@@ -1050,15 +1528,15 @@ class SyncCommandGetMetadata(SyncCommand):
             printMessage("Cancelling " + unicode(self.__class__.__name__) + ": zero connections apply")
             return
 
-        usingConnections.append(self.config_hash)
-        index = -1
         results = []
+        self._connect()
 
         for name in self.config['connections']:
-            index += 1
+            if name not in self.connections:
+                continue
 
             try:
-                metadata = self.connections[index].list(self.file_path)
+                metadata = self._getConnection(name).probe(self.file_path, self.forced)
 
                 if type(metadata) is list and len(metadata) > 0:
                     results.append({
@@ -1066,17 +1544,16 @@ class SyncCommandGetMetadata(SyncCommand):
                         'metadata': metadata[0]
                     })
 
-            except IndexError:
-                continue
-
             except EOFError:
                 printMessage("Connection has been terminated, please retry your action", name, False, True)
-                self._closeConnection()
+                self._closeConnection(name)
 
             except Exception, e:
                 printMessage("getting metadata failed: {" + self.basename + "} <Exception: " + stringifyException(e) + ">", name, False, True)
                 handleException(e)
 
+        self._releaseConnections()
+
         return results
 
 
@@ -1107,7 +1584,13 @@ def performRemoteCheck(file_path, window, forced=False):
             return
 
     try:
-        metadata = SyncCommandGetMetadata(file_path, config_file_path).whitelistConnections(checking).execute()
+        command = SyncCommandGetMetadata(file_path, config_file_path).whitelistConnections(checking)
+
+        # checked on demand, the remote might have been changed by someone else
+        if forced is True:
+            command.setForced()
+
+        metadata = command.execute()
     except Exception, e:
         printMessage("Error when getting metadata: " + stringifyException(e))
         handleException(e)
@@ -1122,9 +1605,13 @@ def performRemoteCheck(file_path, window, forced=False):
     newest = []
     oldest = []
     every = []
+    manifest = getManifest(os.path.dirname(config_file_path))
 
     for entry in metadata:
-        if entry['metadata'].isNewerThan(file_path):
+        # own last upload is stamped later than the file it was made from
+        ownUpload = manifest.isLastUpload(getRemoteLocation(config['connections'][entry['connection']]), file_path, entry['metadata'])
+
+        if entry['metadata'].isNewerThan(file_path) and ownUpload is False:
             newest.append(entry)
             every.append(entry)
         else:
@@ -1208,8 +1695,27 @@ class RemoteSync(sublime_plugin.EventListener):
         if len(blacklistConnections) == len(config['connections']):
             return
 
+        manifest = getManifest(os.path.dirname(config_file_path))
+
+        # saving an unmodified buffer, remotes that already have this version won't be uploaded to
+        unchanged = []
+        if view.is_dirty() is False:
+            for connection in config['connections']:
+                if manifest.isUnchanged(getRemoteLocation(config['connections'][connection]), file_path):
+                    unchanged.append(connection)
+
+        # only remotes with overwrite prevention need to be asked
+        checking = []
+        for connection in config['connections']:
+            if connection not in blacklistConnections and connection not in unchanged and config['connections'][connection]['check_time'] is True:
+                checking.append(connection)
+
+        if len(checking) == 0:
+            return
+
         try:
-            metadata = SyncCommandGetMetadata(file_path, config_file_path).execute()
+            # runs on the UI thread, remotes busy with other transfers are not waited for
+            metadata = SyncCommandGetMetadata(file_path, config_file_path).whitelistConnections(checking).setCheckoutTimeout(uiCheckoutTimeout).execute()
         except Exception, e:
             if str(e).find('No such file'):
                 printMessage("No version of {" + basename + "} found on any server", status=True)
@@ -1223,7 +1729,14 @@ class RemoteSync(sublime_plugin.EventListener):
         index = 0
 
         for entry in metadata:
-            if entry['connection'] not in blacklistConnections and config['connections'][entry['connection']]['check_time'] is True and entry['metadata'].isNewerThan(file_path):
+            properties = config['connections'][entry['connection']]
+
+            # own last upload is stamped later than the file it was made from
+            if manifest.isLastUpload(getRemoteLocation(properties), file_path, entry['metadata']):
+                index += 1
+                continue
+
+            if entry['connection'] not in blacklistConnections and properties['check_time'] is True and entry['metadata'].isNewerThan(file_path):
                 newer.append(entry['connection'])
 
                 if newest is None or newest > entry['metadata'].getLastModified():
@@ -1264,19 +1777,16 @@ class RemoteSync(sublime_plugin.EventListener):
     def on_close(self, view):
         file_path = view.file_name()
 
-        config_file_path = getConfigFile(file_path)
-
         if file_path in checksScheduled:
             checksScheduled.remove(file_path)
 
-        if config_file_path is not None:
-            closeConnection(getFilepathHash(config_file_path))
-
     # When a file is loaded and at least 1 connection has download_on_open enabled
     # it will check those enabled if the remote version is newer and offers the newest to download
     def on_load(self, view):
         file_path = view.file_name()
 
+        self.prewarm(file_path)
+
         if ignore is not None and re_ignore.search(file_path) is not None:
             return
 
@@ -1289,6 +1799,24 @@ class RemoteSync(sublime_plugin.EventListener):
 
             sublime.set_timeout(check, download_on_open_delay)
 
+    # Switching to a file (of possibly another project) prepares its connections
+    def on_activated(self, view):
+        self.prewarm(view.file_name())
+
+    # Starts pre-warming of connections for the file's config
+    # unless done recently (sessions are kept alive meanwhile)
+    def prewarm(self, file_path):
+        config_file_path = getConfigFile(file_path)
+        if config_file_path is None:
+            return
+
+        now = time.time()
+        if config_file_path in prewarmed and now - prewarmed[config_file_path] < settings.get('connection_timeout'):
+            return
+
+        prewarmed[config_file_path] = now
+        RemoteSyncPrewarm(config_file_path).start()
+
 
 # ==== Threading ===========================================================================
 
@@ -1306,6 +1834,46 @@ def fillProgress(progress, entry):
         progress.add([entry])
 
 
+# Returns number of workers to transfer given files with
+#
+# As many as sessions the most permissive remote may ever allow, workers wait for
+# the pools' sessions so that the pools ramp up as far as throughput lets them
+#
+# @type  targets: list<list<file_path, config_file_path>>
+#
+# @return int
+def getTransferConcurrency(targets):
+    limit = 1
+
+    for config_file_path in set([target[1] for target in targets]):
+        config = loadConfig(config_file_path)
+        if config is None:
+            continue
+
+        limit = max(limit, getConfigConcurrency(config))
+
+    return min(limit, len(targets))
+
+
+# Returns the highest number of sessions any remote of a config may allow
+#
+# @type  config: dict
+#
+# @return int
+def getConfigConcurrency(config):
+    limit = 1
+
+    for name in config['connections']:
+        pool = getConnectionPool(config, name)
+
+        if pool.controller is not None:
+            limit = max(limit, pool.controller.getCap())
+        else:
+            limit = max(limit, pool.limit)
+
+    return limit
+
+
 class RemoteSyncCall(threading.Thread):
     def __init__(self, file_path, config, onSave, disregardIgnore=False, whitelistConnections=[]):
         self.file_path = file_path
@@ -1322,14 +1890,29 @@ class RemoteSyncCall(threading.Thread):
             return False
 
         elif type(target) is str or type(target) is unicode:
-            SyncCommandUpload(target, self.config, onSave=self.onSave, disregardIgnore=self.disregardIgnore, whitelistConnections=self.whitelistConnections).execute()
+            command = SyncCommandUpload(target, self.config, onSave=self.onSave, disregardIgnore=self.disregardIgnore, whitelistConnections=self.whitelistConnections)
+
+            # saving without changes
+            if self.onSave is True:
+                command.setSkipUnchanged()
+
+            command.execute()
 
         elif type(target) is list and len(target) > 0:
             progress = Progress()
             fillProgress(progress, target)
 
-            for file_path, config in target:
-                SyncCommandUpload(file_path, config, progress=progress, onSave=self.onSave, disregardIgnore=self.disregardIgnore, whitelistConnections=self.whitelistConnections).execute()
+            def upload(file_path, config):
+                command = SyncCommandUpload(file_path, config, progress=progress, onSave=self.onSave, disregardIgnore=self.disregardIgnore, whitelistConnections=self.whitelistConnections)
+
+                # workers queue for sessions of the pools instead of giving up on the file
+                command.setSkipUnchanged().setCheckoutTimeout(batchCheckoutTimeout).execute()
+
+            callbacks = [lambda file_path=file_path, config=config: upload(file_path, config) for file_path, config in target]
+
+            for result, error in runConcurrently(callbacks, getTransferConcurrency(target)):
+                if error is not None:
+                    handleException(error)
 
 
 class RemoteSyncDownCall(threading.Thread):
@@ -1381,6 +1964,15 @@ class RemoteSyncRename(threading.Thread):
         SyncCommandRename(self.file_path, self.config, self.new_name).execute()
 
 
+class RemoteSyncPrewarm(threading.Thread):
+    def __init__(self, config_file_path):
+        self.config_file_path = config_file_path
+        threading.Thread.__init__(self)
+
+    def run(self):
+        prewarmConnection(self.config_file_path)
+
+
 class RemoteSyncCheck(threading.Thread):
     def __init__(self, file_path, window, forced=False):
         self.file_path = file_path
@@ -1430,12 +2022,17 @@ class FtpSyncTarget(sublime_plugin.TextCommand):
                 empty = True
 
                 for root, dirs, files in os.walk(target):
+                    # files share the config of their folder
+                    config = None
+                    if len(files) > 0:
+                        config = getConfigFile(os.path.join(root, files[0]))
+
                     for file_path in files:
                         empty = False
 
                         if file_path not in fileNames:
                             fileNames.append(target)
-                            syncFiles.append([os.path.join(root, file_path), getConfigFile(os.path.join(root, file_path))])
+                            syncFiles.append([os.path.join(root, file_path), config])
 
                     for folder in dirs:
                         path = os.path.join(root, folder)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2012 Jiri "NoxArt" Petruzelka
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+# @author Jiri "NoxArt" Petruzelka | petruzelka@noxart.cz | @NoxArt
+# @copyright (c) 2012 Jiri "NoxArt" Petruzelka
+# @link https://github.com/NoxArt/SublimeText2-FTPSync
+
+
+
+# Compares parsing of LIST timestamps using time.strptime with parseListTime
+#
+# Usage: python benchmarks/listing.py [lines...]
+#
+# Synthetic listings mix recent ("Mon DD HH:MM") and older ("Mon DD YYYY") entries,
+# both variants run the same LIST line regexp
+
+
+# ==== Libraries ===========================================================================
+
+# Python's built-in libraries
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# FTPSync libraries
+from ftpsyncwrapper import re_ftpListParse, parseListTime
+
+
+# ==== Content =============================================================================
+
+months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+# Returns a synthetic LIST output
+def generateListing(lines):
+    random.seed(lines)
+    listing = []
+
+    for i in range(lines):
+        if random.random() < 0.5:
+            stamp = "%s %2d %02d:%02d" % (random.choice(months), random.randint(1, 28), random.randint(0, 23), random.randint(0, 59))
+        else:
+            stamp = "%s %2d  %d" % (random.choice(months), random.randint(1, 28), random.randint(2000, 2012))
+
+        listing.append("-rw-r--r--    1 user     group    %8d %s file%d.txt" % (random.randint(0, 10 ** 6), stamp, i))
+
+    return listing
+
+
+# Parsing as done previously, strptime and mktime for every entry
+def parseWithStrptime(listing):
+    year = int(time.strftime("%Y", time.gmtime()))
+    config = {'debug_extras': {}}
+    result = []
+
+    for line in listing:
+        try:
+            if config['debug_extras']['print_list_result'] is True:
+                print line
+        except KeyError:
+            pass
+
+        value = re_ftpListParse.search(line).group(3)
+
+        if value.find(':') is -1:
+            struct = time.strptime(value + str(" 00:00"), "%b %d %Y %H:%M")
+        else:
+            struct = time.strptime(str(year) + " " + value, "%Y %b %d %H:%M")
+
+        result.append(time.mktime(struct))
+
+    return result
+
+
+# Parsing using the month table and integer arithmetic
+def parseWithTable(listing):
+    today = time.localtime()
+    result = []
+
+    for line in listing:
+        result.append(parseListTime(re_ftpListParse.search(line).group(3), today))
+
+    return result
+
+
+def main():
+    sizes = [10000, 100000]
+
+    if len(sys.argv) > 1:
+        sizes = [int(size) for size in sys.argv[1:]]
+
+    for size in sizes:
+        listing = generateListing(size)
+        print str(size) + " lines"
+
+        for name, parse in [("strptime", parseWithStrptime), ("table", parseWithTable)]:
+            started = time.time()
+            parse(listing)
+            elapsed = time.time() - started
+
+            print "  %-10s %7.3f s  %9.0f lines/s" % (name, elapsed, size / elapsed)
+
+
+if __name__ == '__main__':
+    main()
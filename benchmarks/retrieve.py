@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2012 Jiri "NoxArt" Petruzelka
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+# @author Jiri "NoxArt" Petruzelka | petruzelka@noxart.cz | @NoxArt
+# @copyright (c) 2012 Jiri "NoxArt" Petruzelka
+# @link https://github.com/NoxArt/SublimeText2-FTPSync
+
+
+
+# Compares receiving a download using ftplib's retrbinary (new string per block)
+# with FTPSConnection's recv_into path (single reusable buffer)
+#
+# Usage: python benchmarks/retrieve.py [megabytes] [block size] [rounds]
+#
+# Data are served over a local socket, so the numbers show CPU cost of the receiving
+# loop rather than network throughput (CPU time includes the sending thread)
+#
+# Single runs vary a lot, both ways are run alternately {rounds} times and the median
+# is reported along with the range
+
+
+# ==== Libraries ===========================================================================
+
+# Python's built-in libraries
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# FTPSync libraries
+import ftplib
+from ftpsyncwrapper import FTPSConnection
+
+
+# ==== Content =============================================================================
+
+# Control connection replacement serving data from a local socket
+class LocalServer:
+
+    def __init__(self, size):
+        self.size = size
+
+    def voidcmd(self, command):
+        return '200 OK'
+
+    def voidresp(self):
+        return '226 Transfer complete'
+
+    def quit(self):
+        pass
+
+    def transfercmd(self, command, rest=None):
+        return self.ntransfercmd(command, rest)[0]
+
+    def ntransfercmd(self, command, rest=None):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+
+        def send():
+            conn, address = listener.accept()
+            chunk = os.urandom(65536)
+            remaining = self.size
+
+            while remaining > 0:
+                conn.sendall(chunk[:min(remaining, len(chunk))])
+                remaining -= len(chunk)
+
+            conn.close()
+            listener.close()
+
+        sender = threading.Thread(target=send)
+        sender.daemon = True
+        sender.start()
+
+        return socket.create_connection(listener.getsockname()), None
+
+
+# Returns wall and CPU time of a receiving function
+def measure(receive):
+    target = tempfile.TemporaryFile()
+    cpu = os.times()
+    started = time.time()
+
+    receive(target)
+
+    elapsed = time.time() - started
+    cpu = sum(os.times()[:2]) - sum(cpu[:2])
+    target.close()
+
+    return elapsed, cpu
+
+
+# Returns median of a list of numbers
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+
+    if len(values) % 2 == 1:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    megabytes = 256
+    blockSize = 65536
+    rounds = 7
+
+    if len(sys.argv) > 1:
+        megabytes = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        blockSize = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        rounds = int(sys.argv[3])
+
+    server = LocalServer(megabytes * 1024 * 1024)
+
+    def retrbinary(target):
+        ftplib.FTP.retrbinary.im_func(server, 'RETR file', lambda data: target.write(data), blockSize)
+
+    connection = FTPSConnection({'tls': False}, {}, 'benchmark')
+    connection.connection = server
+
+    def recvInto(target):
+        connection._FTPSConnection__retrbinary('RETR file', target.write, blockSize)
+
+    print "Receiving " + str(megabytes) + " MB in blocks of " + str(blockSize) + " bytes, " + str(rounds) + " rounds"
+
+    receivers = [("retrbinary", retrbinary), ("recv_into", recvInto)]
+    results = dict([(name, ([], [])) for name, receive in receivers])
+
+    for index in range(rounds):
+        # alternate the order so that neither always runs on a warmed up system
+        order = receivers
+        if index % 2 == 1:
+            order = list(reversed(receivers))
+
+        for name, receive in order:
+            elapsed, cpu = measure(receive)
+            results[name][0].append(megabytes / elapsed)
+            results[name][1].append(cpu)
+
+    for name in ["retrbinary", "recv_into"]:
+        throughput, cpu = results[name]
+        print "%-12s %7.1f MB/s (%.1f-%.1f)  %5.2f s CPU (%.2f-%.2f)" % (name, median(throughput), min(throughput), max(throughput), median(cpu), min(cpu), max(cpu))
+
+
+if __name__ == '__main__':
+    main()
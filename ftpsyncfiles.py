@@ -31,6 +31,7 @@
 
 # Python's built-in libraries
 import os
+import shutil
 import datetime
 import fnmatch
 import re
@@ -269,6 +270,29 @@ def getChangedFiles(metafilesBefore, metafilesAfter):
     return changed
 
 
+# Replaces a file with another one, atomically where the platform allows
+#
+# Permissions of the replaced file are kept
+#
+# @type source: string
+# @param source: file to be moved
+# @type target: string
+# @param target: file to be replaced
+def replaceFile(source, target):
+    if os.path.exists(target):
+        shutil.copymode(target, source)
+
+    try:
+        os.rename(source, target)
+    except OSError:
+        # Windows does not replace existing files
+        if os.name != 'nt' or os.path.exists(target) is False:
+            raise
+
+        os.remove(target)
+        os.rename(source, target)
+
+
 
 # Guesses whether given file is textual or not
 #
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2012 Jiri "NoxArt" Petruzelka
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+# @author Jiri "NoxArt" Petruzelka | petruzelka@noxart.cz | @NoxArt
+# @copyright (c) 2012 Jiri "NoxArt" Petruzelka
+# @link https://github.com/NoxArt/SublimeText2-FTPSync
+
+
+
+# ==== Libraries ===========================================================================
+
+# Python's built-in libraries
+import json
+import os
+import threading
+
+
+# ==== Initialization and optimization =====================================================
+
+# name of a journal file, stored next to the config file
+journalName = 'ftpsync.journal'
+
+# journals by path, path => TransferJournal
+journals = {}
+
+# guards the journals
+journalsLock = threading.Lock()
+
+
+# ==== Content =============================================================================
+
+# Returns journal of unfinished transfers stored in given folder
+#
+# @type folder: string
+# @param folder: folder with the config file
+#
+# @return TransferJournal
+#
+# @global journals
+# @global journalName
+def getJournal(folder):
+    path = os.path.join(folder, journalName)
+
+    with journalsLock:
+        if path not in journals:
+            journals[path] = TransferJournal(path)
+
+        return journals[path]
+
+
+# Persistent record of unfinished transfers
+#
+# Entry is stored before a transfer starts and removed once it succeeds,
+# so an interrupted transfer can be resumed even after a restart
+class TransferJournal:
+
+    # Constructor
+    #
+    # @type self: TransferJournal
+    # @type path: string
+    # @param path: file the journal is stored in
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.lock = threading.Lock()
+
+
+    # Returns entry of an unfinished transfer
+    #
+    # @type self: TransferJournal
+    # @type key: string
+    #
+    # @return dict|None
+    def get(self, key):
+        with self.lock:
+            return self.__load().get(key)
+
+
+    # Records a started transfer
+    #
+    # @type self: TransferJournal
+    # @type key: string
+    # @type entry: dict
+    # @param entry: information needed to verify the transfer can be resumed
+    def start(self, key, entry):
+        with self.lock:
+            entries = self.__load()
+
+            if entries.get(key) != entry:
+                entries[key] = entry
+                self.__store()
+
+
+    # Removes entry of a finished transfer
+    #
+    # @type self: TransferJournal
+    # @type key: string
+    def finish(self, key):
+        with self.lock:
+            entries = self.__load()
+
+            if key in entries:
+                entries.pop(key)
+                self.__store()
+
+
+    # Loads the entries if not loaded yet, to be called under lock
+    #
+    # @type self: TransferJournal
+    #
+    # @return dict
+    def __load(self):
+        if self.entries is None:
+            self.entries = {}
+
+            try:
+                if os.path.exists(self.path):
+                    with open(self.path, 'r') as journal:
+                        self.entries = json.load(journal)
+            except (IOError, ValueError):
+                pass
+
+        return self.entries
+
+
+    # Stores the entries, removes the file when empty, to be called under lock
+    #
+    # @type self: TransferJournal
+    def __store(self):
+        try:
+            if len(self.entries) == 0:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            else:
+                with open(self.path, 'w') as journal:
+                    json.dump(self.entries, journal)
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2012 Jiri "NoxArt" Petruzelka
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+# @author Jiri "NoxArt" Petruzelka | petruzelka@noxart.cz | @NoxArt
+# @copyright (c) 2012 Jiri "NoxArt" Petruzelka
+# @link https://github.com/NoxArt/SublimeText2-FTPSync
+
+
+
+# ==== Libraries ===========================================================================
+
+# Python's built-in libraries
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+# ==== Initialization and optimization =====================================================
+
+# name of a manifest file, stored next to the config file
+manifestName = 'ftpsync.manifest'
+
+# size of blocks a file is read in when computing its digest [bytes]
+digestBlockSize = 65536
+
+# manifest is rewritten when it has this many times more lines than entries
+compactRatio = 4
+
+# allowed difference of server's and local clock when recognizing own uploads [seconds]
+uploadTimeTolerance = 2
+
+# manifests by path, path => SyncManifest
+manifests = {}
+
+# guards the manifests
+manifestsLock = threading.Lock()
+
+
+# ==== Content =============================================================================
+
+# Returns manifest of uploaded files of the config in given folder
+#
+# @type folder: string
+# @param folder: folder with the config file
+#
+# @return SyncManifest
+#
+# @global manifests
+# @global manifestName
+def getManifest(folder):
+    path = os.path.join(folder, manifestName)
+
+    with manifestsLock:
+        if path not in manifests:
+            manifests[path] = SyncManifest(path)
+
+        return manifests[path]
+
+
+# Returns digest of file contents
+#
+# @type file_path: string
+#
+# @return string
+#
+# @global digestBlockSize
+def getDigest(file_path):
+    digest = hashlib.md5()
+
+    with open(file_path, 'rb') as contents:
+        while True:
+            block = contents.read(digestBlockSize)
+            if not block:
+                break
+
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+# Record of files as they were last uploaded to each remote location
+#
+# Stored as an append-only file of JSON lines, a later line overrides an earlier one
+# for the same remote location and file
+class SyncManifest:
+
+    # Constructor
+    #
+    # @type self: SyncManifest
+    # @type path: string
+    # @param path: file the manifest is stored in
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(path)
+        self.entries = None
+        self.lines = 0
+        self.lock = threading.Lock()
+
+
+    # Returns whether the file is the same as when last uploaded to the remote
+    #
+    # Size and modification time are compared first, contents only when the time differs
+    #
+    # @type self: SyncManifest
+    # @type remote: string
+    # @param remote: identity of the remote location (server and path)
+    # @type file_path: string
+    #
+    # @return bool
+    def isUnchanged(self, remote, file_path):
+        key = self.__getKey(remote, file_path)
+
+        with self.lock:
+            entry = self.__load().get(key)
+
+        if entry is None or os.path.isfile(file_path) is False:
+            return False
+
+        stat = os.stat(file_path)
+        if stat.st_size != entry['size']:
+            return False
+
+        if stat.st_mtime == entry['mtime']:
+            return True
+
+        digest = getDigest(file_path)
+        if entry['digest'] is None or digest != entry['digest']:
+            return False
+
+        # only touched, remember the new time
+        self.record(remote, file_path, stat, digest, entry.get('uploaded', 0))
+
+        return True
+
+
+    # Returns whether a remote file is the version last uploaded there
+    #
+    # Servers stamp files with the time the upload finished, own upload would otherwise
+    # look newer than the local file it was made from
+    #
+    # @type self: SyncManifest
+    # @type remote: string
+    # @param remote: identity of the remote location (server and path)
+    # @type file_path: string
+    # @type metafile: Metafile
+    # @param metafile: remote file's metadata
+    #
+    # @return bool
+    #
+    # @global uploadTimeTolerance
+    def isLastUpload(self, remote, file_path, metafile):
+        key = self.__getKey(remote, file_path)
+
+        with self.lock:
+            entry = self.__load().get(key)
+
+        if entry is None or 'uploaded' not in entry:
+            return False
+
+        return int(metafile.getFilesize()) == entry['size'] and metafile.getLastModified() <= entry['uploaded'] + uploadTimeTolerance
+
+
+    # Records a successful upload of the file to the remote location
+    #
+    # Digest is only stored when the file still is as it was sent, contents of what
+    # was sent are unknown otherwise and it's compared as changed next time
+    #
+    # @type self: SyncManifest
+    # @type remote: string
+    # @param remote: identity of the remote location (server and path)
+    # @type file_path: string
+    # @type sent: os.stat_result|None
+    # @param sent: state of the file when it was sent, None = as it is now
+    # @type digest: string|None
+    # @param digest: digest of the file as sent if already known
+    # @type uploaded: float|None
+    # @param uploaded: time the upload finished, None = now
+    def record(self, remote, file_path, sent=None, digest=None, uploaded=None):
+        if os.path.isfile(file_path) is False:
+            return
+
+        if uploaded is None:
+            uploaded = time.time()
+
+        if sent is None:
+            sent = os.stat(file_path)
+
+        if digest is None and self.__isAsSent(file_path, sent):
+            digest = getDigest(file_path)
+
+            # changed while being read
+            if self.__isAsSent(file_path, sent) is False:
+                digest = None
+
+        key = self.__getKey(remote, file_path)
+        entry = {"remote": key[0], "path": key[1], "size": sent.st_size, "mtime": sent.st_mtime, "digest": digest, "uploaded": uploaded}
+
+        with self.lock:
+            entries = self.__load()
+            entries[key] = entry
+
+            try:
+                if self.lines >= compactRatio * len(entries):
+                    self.__compact()
+                else:
+                    with open(self.path, 'a') as manifest:
+                        manifest.write(json.dumps(entry) + "\n")
+
+                    self.lines += 1
+            except (IOError, OSError):
+                pass
+
+
+    # Returns whether the file's size and modification time are the same as when it was sent
+    #
+    # @type self: SyncManifest
+    # @type file_path: string
+    # @type sent: os.stat_result
+    #
+    # @return bool
+    def __isAsSent(self, file_path, sent):
+        stat = os.stat(file_path)
+
+        return stat.st_size == sent.st_size and stat.st_mtime == sent.st_mtime
+
+
+    # Returns key of an entry
+    #
+    # @type self: SyncManifest
+    # @type remote: string
+    # @type file_path: string
+    #
+    # @return tuple<remote, path relative to the config>
+    def __getKey(self, remote, file_path):
+        return (unicode(remote), unicode(os.path.relpath(file_path, self.root).replace('\\', '/')))
+
+
+    # Loads the entries if not loaded yet, to be called under lock
+    #
+    # @type self: SyncManifest
+    #
+    # @return dict
+    def __load(self):
+        if self.entries is not None:
+            return self.entries
+
+        self.entries = {}
+
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as manifest:
+                    for line in manifest:
+                        self.lines += 1
+
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # incomplete last line
+                            continue
+
+                        self.entries[(entry['remote'], entry['path'])] = entry
+        except IOError:
+            pass
+
+        return self.entries
+
+
+    # Rewrites the manifest with only the current entries, to be called under lock
+    #
+    # @type self: SyncManifest
+    def __compact(self):
+        temporary = self.path + ".tmp"
+
+        with open(temporary, 'w') as manifest:
+            for entry in self.entries.values():
+                manifest.write(json.dumps(entry) + "\n")
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        os.rename(temporary, self.path)
+        self.lines = len(self.entries)
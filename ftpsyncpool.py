@@ -0,0 +1,758 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2012 Jiri "NoxArt" Petruzelka
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+# @author Jiri "NoxArt" Petruzelka | petruzelka@noxart.cz | @NoxArt
+# @copyright (c) 2012 Jiri "NoxArt" Petruzelka
+# @link https://github.com/NoxArt/SublimeText2-FTPSync
+
+# ==== Libraries ===========================================================================
+
+# Python's built-in libraries
+import re
+import sys
+import threading
+import time
+
+
+# ==== Initialization and optimization =====================================================
+
+# error code - first 3-digit number https://tools.ietf.org/html/rfc959#page-39
+re_errorCode = re.compile("[1-5]\d\d")
+
+# codes the servers use to refuse a session over their limit
+# 421 too many connections, 530 too many users (or bad login when no session is open)
+limitErrorCodes = [421, 530]
+
+# length of a window throughput is measured over [seconds]
+throughputWindow = 2
+
+# relative throughput change considered significant
+throughputTolerance = 0.05
+
+# period after which a discovered server limit is probed again [seconds]
+learnedLimitExpiry = 3600
+
+
+# ==== Exceptions ==========================================================================
+
+class PoolExhaustedException(Exception):
+    pass
+
+class CircuitOpenException(Exception):
+    pass
+
+class ServerLimitException(Exception):
+    pass
+
+
+# ==== Content =============================================================================
+
+# Stops further connection attempts to a remote that keeps failing
+#
+# After {threshold} consecutive failures the circuit opens and attempts fail fast
+# until a background probe succeeds
+class CircuitBreaker:
+
+    # Constructor
+    #
+    # @type self: CircuitBreaker
+    # @type threshold: int
+    # @param threshold: number of consecutive failures opening the circuit
+    # @type cooldown: int|float
+    # @param cooldown: time between probes while open [seconds]
+    def __init__(self, threshold, cooldown):
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.failures = 0
+        self.openedAt = None
+
+
+    # Returns whether attempts should fail fast
+    #
+    # @type self: CircuitBreaker
+    #
+    # @return bool
+    def isOpen(self):
+        return self.openedAt is not None
+
+
+    # Returns number of seconds until the next probe
+    #
+    # @type self: CircuitBreaker
+    #
+    # @return float
+    def getRemaining(self):
+        if self.openedAt is None:
+            return 0
+
+        return max(0, self.openedAt + self.cooldown - time.time())
+
+
+    # Records a successful attempt, closes the circuit
+    #
+    # @type self: CircuitBreaker
+    def recordSuccess(self):
+        self.failures = 0
+        self.openedAt = None
+
+
+    # Records a failed attempt
+    #
+    # @type self: CircuitBreaker
+    #
+    # @return bool whether the circuit has just been opened
+    def recordFailure(self):
+        self.failures += 1
+
+        if self.openedAt is not None:
+            self.openedAt = time.time()
+        elif self.failures >= self.threshold:
+            self.openedAt = time.time()
+            return True
+
+        return False
+
+
+# Adapts number of sessions to a server (AIMD)
+#
+# Increases the limit by one while aggregate throughput keeps improving, halves it on timeouts
+# and drops it to the number of open sessions when the server refuses another one
+#
+# Throughput is measured only over time some session was checked out, discovered server
+# limits stop applying after {learnedLimitExpiry} so that they get probed again
+class ConcurrencyController:
+
+    # Constructor
+    #
+    # @type self: ConcurrencyController
+    # @type ceiling: int
+    # @param ceiling: configured maximum of sessions
+    # @type learned: int|None
+    # @param learned: limit of the server discovered previously
+    # @type onLearned: callback<int>|None
+    # @param onLearned: called when a server limit is discovered
+    # @type learnedAt: float|None
+    # @param learnedAt: timestamp of discovering {learned}, None = now
+    def __init__(self, ceiling, learned=None, onLearned=None, learnedAt=None):
+        self.ceiling = max(1, int(ceiling))
+        self.learned = learned
+        self.learnedAt = learnedAt
+        self.onLearned = onLearned
+
+        if learnedAt is None:
+            self.learnedAt = time.time()
+
+        self.limit = min(2, self.getCap())
+        self.lastChange = 0
+        self.lastThroughput = None
+        self.active = 0
+        self.activeSince = None
+        self.windowElapsed = 0
+        self.windowBytes = 0
+        self.windowSaturated = False
+
+
+    # Returns the highest allowed limit
+    #
+    # @type self: ConcurrencyController
+    #
+    # @return int
+    #
+    # @global learnedLimitExpiry
+    def getCap(self):
+        if self.learned is not None and time.time() - self.learnedAt < learnedLimitExpiry:
+            return max(1, min(self.ceiling, self.learned))
+
+        return self.ceiling
+
+
+    # Returns current limit of sessions
+    #
+    # @type self: ConcurrencyController
+    #
+    # @return int
+    def getLimit(self):
+        return self.limit
+
+
+    # Returns whether the error means the server refused a session over its limit
+    #
+    # @type self: ConcurrencyController
+    # @type exception: Exception
+    # @type sessions: int
+    # @param sessions: number of currently open sessions
+    #
+    # @return bool
+    #
+    # @global re_errorCode
+    # @global limitErrorCodes
+    def isLimitError(self, exception, sessions):
+        # with no session open a 530 is more likely a bad login
+        if sessions == 0:
+            return False
+
+        code = re_errorCode.search(str(exception))
+
+        return code is not None and int(code.group(0)) in limitErrorCodes
+
+
+    # Records refusal of a session by the server
+    #
+    # @type self: ConcurrencyController
+    # @type sessions: int
+    # @param sessions: number of sessions open at the time
+    def recordRefusal(self, sessions):
+        self.learned = max(1, sessions)
+        self.learnedAt = time.time()
+        self.limit = min(self.limit, self.learned)
+        self.lastChange = -1
+
+        if self.onLearned is not None:
+            self.onLearned(self.learned)
+
+
+    # Records a session being checked out, starts measuring time
+    #
+    # @type self: ConcurrencyController
+    def recordCheckout(self):
+        if self.active == 0:
+            self.activeSince = time.time()
+
+        self.active += 1
+
+
+    # Records a timed out operation (multiplicative decrease)
+    #
+    # @type self: ConcurrencyController
+    def recordTimeout(self):
+        self.__recordCheckin()
+        self.limit = max(1, self.limit // 2)
+        self.lastChange = -1
+
+
+    # Records a finished use of a session (additive increase)
+    #
+    # @type self: ConcurrencyController
+    # @type transferred: int
+    # @param transferred: number of bytes transferred
+    # @type saturated: bool
+    # @param saturated: whether all allowed sessions were in use
+    #
+    # @global throughputWindow
+    # @global throughputTolerance
+    def recordTransfer(self, transferred, saturated):
+        self.__recordCheckin()
+        self.windowBytes += transferred
+        self.windowSaturated = self.windowSaturated or saturated
+
+        elapsed = self.windowElapsed
+        if elapsed < throughputWindow:
+            return
+
+        throughput = self.windowBytes / elapsed
+        improved = self.lastThroughput is None or throughput > self.lastThroughput * (1 + throughputTolerance)
+
+        # the added session did not help
+        if self.lastChange == 1 and improved is False:
+            self.limit = max(1, self.limit - 1)
+            self.lastChange = -1
+        elif self.windowSaturated and improved and self.limit < self.getCap():
+            self.limit += 1
+            self.lastChange = 1
+        else:
+            self.lastChange = 0
+
+        self.lastThroughput = throughput
+        self.windowElapsed = 0
+        self.windowBytes = 0
+        self.windowSaturated = False
+
+
+    # Adds time since the last change of checked out sessions to the window
+    #
+    # @type self: ConcurrencyController
+    def __recordCheckin(self):
+        if self.active == 0:
+            return
+
+        now = time.time()
+        self.windowElapsed += now - self.activeSince
+        self.activeSince = now
+        self.active -= 1
+
+
+# Pool of authenticated sessions to a single remote
+#
+# Sessions are handed out by checkout() and have to be returned using checkin(),
+# at most {limit} of them exist at a time, broken ones are closed and replaced
+class ConnectionPool:
+
+    # Constructor
+    #
+    # @type self: ConnectionPool
+    # @type name: string
+    # @param name: label of the remote endpoint
+    # @type factory: callback<>
+    # @param factory: returns a new connected and logged in session
+    # @type limit: int
+    # @param limit: maximum number of simultaneously opened sessions
+    # @type breaker: CircuitBreaker|None
+    # @param breaker: guards opening of new sessions
+    # @type controller: ConcurrencyController|None
+    # @param controller: adapts the limit to the server, overrides {limit}
+    def __init__(self, name, factory, limit=1, breaker=None, controller=None):
+        self.name = name
+        self.factory = factory
+        self.limit = max(1, int(limit))
+        self.breaker = breaker
+        self.controller = controller
+
+        if controller is not None:
+            self.limit = controller.getLimit()
+
+        self.idle = []
+        self.busy = []
+        self.opening = 0
+        self.isClosed = False
+        self.condition = threading.Condition()
+
+
+    # Hands out a session, opens a new one if none is idle and the limit allows,
+    # otherwise waits until some other is returned
+    #
+    # @type self: ConnectionPool
+    # @type timeout: None|int|float
+    # @param timeout: maximum time to wait for a free session [seconds], None = forever
+    #
+    # @return session (AbstractConnection descendant)
+    #
+    # @throws PoolExhaustedException
+    # @throws CircuitOpenException
+    def checkout(self, timeout=None):
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while True:
+            connection = self.__checkoutOnce(deadline)
+            if connection is not None:
+                return connection
+
+            try:
+                return self.__open(self.busy)
+            except ServerLimitException:
+                # wait for one of the open sessions
+                continue
+
+
+    # Hands out an idle session or reserves a slot for opening a new one
+    #
+    # @type self: ConnectionPool
+    # @type deadline: None|float
+    #
+    # @return AbstractConnection or None when a slot has been reserved
+    def __checkoutOnce(self, deadline):
+        broken = []
+        self.condition.acquire()
+        try:
+            while True:
+                while len(self.idle) > 0:
+                    connection = self.idle.pop()
+
+                    if connection.isAlive():
+                        self.busy.append(connection)
+                        self.__recordCheckout()
+                        return connection
+                    else:
+                        broken.append(connection)
+
+                if len(self.busy) + self.opening < self.limit:
+                    if self.__isBlocked() is False:
+                        self.opening += 1
+                        break
+
+                    # nothing is going to be returned
+                    if len(self.busy) + self.opening == 0:
+                        self.__raiseBlocked()
+
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+
+                    if remaining <= 0:
+                        raise PoolExhaustedException("All " + str(self.limit) + " connection(s) are in use")
+
+                self.condition.wait(remaining)
+        finally:
+            self.condition.release()
+            self.__dispose(broken)
+
+        return None
+
+
+    # Opens a new session in advance unless some is idle or the limit is reached
+    #
+    # @type self: ConnectionPool
+    #
+    # @return bool whether a session was opened
+    #
+    # @throws CircuitOpenException
+    def prepare(self):
+        self.condition.acquire()
+        try:
+            if len(self.idle) > 0 or len(self.busy) + self.opening >= self.limit:
+                return False
+
+            if self.__isBlocked():
+                if len(self.busy) + self.opening == 0:
+                    self.__raiseBlocked()
+
+                return False
+
+            self.opening += 1
+        finally:
+            self.condition.release()
+
+        try:
+            self.__open(self.idle)
+        except ServerLimitException:
+            return False
+
+        return True
+
+
+    # Returns a session into the pool
+    #
+    # Sessions that are broken, foreign or returned into a closed pool are closed
+    #
+    # @type self: ConnectionPool
+    # @type connection: AbstractConnection
+    def checkin(self, connection):
+        self.__checkin(connection, True)
+
+
+    # Returns a session into the pool
+    #
+    # @type self: ConnectionPool
+    # @type connection: AbstractConnection
+    # @type adapt: bool
+    # @param adapt: whether the use of the session is passed to the controller
+    def __checkin(self, connection, adapt):
+        dispose = True
+
+        self.condition.acquire()
+        try:
+            if connection in self.busy:
+                if adapt:
+                    self.__adapt(connection)
+
+                self.busy.remove(connection)
+
+                # limit might have been lowered meanwhile
+                fits = len(self.busy) + len(self.idle) + self.opening < self.limit
+
+                if self.isClosed is False and connection.isAlive() and fits:
+                    self.idle.append(connection)
+                    dispose = False
+
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+        if dispose:
+            self.__dispose([connection])
+
+
+    # Returns whether some session is currently checked out
+    #
+    # @type self: ConnectionPool
+    #
+    # @return bool
+    def isBusy(self):
+        return len(self.busy) + self.opening > 0
+
+
+    # Sends keep-alive to idle sessions and closes those idle for too long
+    #
+    # @type self: ConnectionPool
+    # @type keepAliveInterval: int|float
+    # @param keepAliveInterval: ping sessions silent for at least this long [seconds], 0 = never
+    # @type idleTimeout: int|float
+    # @param idleTimeout: close sessions not used for longer than this [seconds]
+    def maintain(self, keepAliveInterval, idleTimeout):
+        expired = []
+        silent = []
+
+        self.condition.acquire()
+        try:
+            for connection in list(self.idle):
+                if connection.isAlive() is False or connection.getIdleTime() > idleTimeout:
+                    self.idle.remove(connection)
+                    expired.append(connection)
+                elif keepAliveInterval > 0 and connection.getSilentTime() >= keepAliveInterval:
+                    # counted as busy so that nobody else gets it meanwhile
+                    self.idle.remove(connection)
+                    self.busy.append(connection)
+                    silent.append(connection)
+        finally:
+            self.condition.release()
+
+        self.__dispose(expired)
+
+        for connection in silent:
+            try:
+                connection.keepAlive()
+            except Exception:
+                connection.close()
+
+            # keep-alive is not a use of the session, it would distort throughput
+            self.__checkin(connection, False)
+
+
+    # Closes idle sessions and marks the pool as closed,
+    # sessions in use get closed when returned
+    #
+    # @type self: ConnectionPool
+    def close(self):
+        self.condition.acquire()
+        try:
+            self.isClosed = True
+            idle = self.idle
+            self.idle = []
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+        self.__dispose(idle)
+
+
+    # Opens a new session for which a slot has been reserved in {opening}
+    #
+    # @type self: ConnectionPool
+    # @type target: list
+    # @param target: either self.idle or self.busy
+    #
+    # @return AbstractConnection
+    #
+    # @throws ServerLimitException when the server refused it over its limit
+    def __open(self, target):
+        try:
+            connection = self.factory()
+        except Exception, e:
+            info = sys.exc_info()
+
+            self.condition.acquire()
+            self.opening -= 1
+            sessions = len(self.busy) + len(self.idle)
+            refused = self.controller is not None and self.controller.isLimitError(e, sessions)
+
+            if refused:
+                self.controller.recordRefusal(sessions)
+                self.limit = self.controller.getLimit()
+                probe = False
+            else:
+                probe = self.__record(False)
+
+            self.condition.notifyAll()
+            self.condition.release()
+
+            if probe:
+                self.__scheduleProbe()
+
+            if refused:
+                raise ServerLimitException("Server refused connection over its limit of " + str(sessions))
+
+            raise info[0], info[1], info[2]
+
+        self.condition.acquire()
+        self.opening -= 1
+        target.append(connection)
+        self.__record(True)
+
+        if target is self.busy:
+            self.__recordCheckout()
+
+        self.condition.notify()
+        self.condition.release()
+
+        return connection
+
+
+    # Passes statistics of a returned session to the controller, to be called under lock
+    #
+    # @type self: ConnectionPool
+    # @type connection: AbstractConnection
+    def __adapt(self, connection):
+        transferred, timeouts = connection.takeTransferStats()
+
+        if self.controller is None:
+            return
+
+        if timeouts > 0:
+            self.controller.recordTimeout()
+        else:
+            self.controller.recordTransfer(transferred, len(self.busy) + self.opening >= self.limit)
+
+        self.limit = self.controller.getLimit()
+
+
+    # Passes a checkout of a session to the controller, to be called under lock
+    #
+    # @type self: ConnectionPool
+    def __recordCheckout(self):
+        if self.controller is not None:
+            self.controller.recordCheckout()
+
+
+    # Records result of opening a session into the breaker, to be called under lock
+    #
+    # @type self: ConnectionPool
+    # @type success: bool
+    #
+    # @return bool whether a probe needs to be scheduled
+    def __record(self, success):
+        if self.breaker is None:
+            return False
+
+        if success:
+            self.breaker.recordSuccess()
+            return False
+
+        return self.breaker.recordFailure()
+
+
+    # Returns whether opening new sessions is blocked by the breaker
+    #
+    # @type self: ConnectionPool
+    #
+    # @return bool
+    def __isBlocked(self):
+        return self.breaker is not None and self.breaker.isOpen()
+
+
+    # @type self: ConnectionPool
+    #
+    # @throws CircuitOpenException
+    def __raiseBlocked(self):
+        raise CircuitOpenException("Remote keeps failing, next attempt in " + str(int(self.breaker.getRemaining())) + " seconds")
+
+
+    # Schedules a background attempt to open a session after the cooldown
+    #
+    # @type self: ConnectionPool
+    def __scheduleProbe(self):
+        timer = threading.Timer(self.breaker.cooldown, self.__probe)
+        timer.daemon = True
+        timer.start()
+
+
+    # Tries to open a session, closes the circuit on success, otherwise waits another cooldown
+    #
+    # @type self: ConnectionPool
+    def __probe(self):
+        self.condition.acquire()
+        try:
+            if self.isClosed:
+                return
+
+            if len(self.busy) + self.opening >= self.limit:
+                retry = True
+            else:
+                retry = False
+                self.opening += 1
+        finally:
+            self.condition.release()
+
+        if retry:
+            self.__scheduleProbe()
+            return
+
+        try:
+            self.__open(self.idle)
+        except Exception:
+            self.__scheduleProbe()
+
+
+    # Closes given sessions, ignores errors
+    #
+    # @type self: ConnectionPool
+    # @type connections: list<AbstractConnection>
+    def __dispose(self, connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+# Background thread periodically maintaining sessions of all pools
+#
+# Keeps idle sessions alive and closes those unused for longer than the timeout
+class KeepAliveScheduler(threading.Thread):
+
+    # Constructor
+    #
+    # @type self: KeepAliveScheduler
+    # @type getPools: callback<>
+    # @param getPools: returns list of ConnectionPool to be maintained
+    # @type keepAliveInterval: int|float
+    # @param keepAliveInterval: keep-alive period [seconds], 0 = no keep-alive
+    # @type idleTimeout: int|float
+    # @param idleTimeout: period after which an unused session is closed [seconds]
+    def __init__(self, getPools, keepAliveInterval, idleTimeout):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.getPools = getPools
+        self.keepAliveInterval = keepAliveInterval
+        self.idleTimeout = idleTimeout
+        self.stopped = threading.Event()
+
+
+    # Runs maintenance until stopped
+    #
+    # @type self: KeepAliveScheduler
+    def run(self):
+        period = self.keepAliveInterval
+        if period <= 0:
+            period = self.idleTimeout
+
+        while True:
+            self.stopped.wait(period)
+
+            if self.stopped.isSet():
+                return
+
+            for pool in self.getPools():
+                try:
+                    pool.maintain(self.keepAliveInterval, self.idleTimeout)
+                except Exception:
+                    pass
+
+
+    # Stops the scheduler
+    #
+    # @type self: KeepAliveScheduler
+    def stop(self):
+        self.stopped.set()
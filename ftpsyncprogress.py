@@ -31,15 +31,19 @@
 
 # Python's built-in libraries
 import math
+import threading
 
 
 # ==== Content =============================================================================
 
 # Class implementing logic for progress bar
+#
+# Entries may be finished from several threads at once
 class Progress:
     def __init__(self, current=0):
         self.current = 0
         self.entries = []
+        self.lock = threading.Lock()
 
     # Add unfinished entries to progress bar
     #
@@ -67,10 +71,11 @@ class Progress:
     # @type  by: integer
     # @param by: number of finished items
     def progress(self, by=1):
-        self.current += int(by)
+        with self.lock:
+            self.current += int(by)
 
-        if self.current > self.getTotal():
-            self.current = self.getTotal()
+            if self.current > self.getTotal():
+                self.current = self.getTotal()
 
 
     # Get percentage of the progress bar, maybe rounded, see @return
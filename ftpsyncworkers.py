@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2012 Jiri "NoxArt" Petruzelka
+#
+# Permission is hereby granted, free of charge, to any person
+# obtaining a copy of this software and associated documentation
+# files (the "Software"), to deal in the Software without
+# restriction, including without limitation the rights to use,
+# copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following
+# conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES
+# OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY,
+# WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+# OTHER DEALINGS IN THE SOFTWARE.
+
+# @author Jiri "NoxArt" Petruzelka | petruzelka@noxart.cz | @NoxArt
+# @copyright (c) 2012 Jiri "NoxArt" Petruzelka
+# @link https://github.com/NoxArt/SublimeText2-FTPSync
+
+# ==== Libraries ===========================================================================
+
+# Python's built-in libraries
+import Queue
+import sys
+import threading
+
+
+# ==== Content =============================================================================
+
+# Runs given callbacks concurrently, at most {limit} at a time
+#
+# Callbacks are taken in order by a fixed number of worker threads.
+# Exception raised by a callback does not affect the others, it's returned instead
+#
+# @type callbacks: list<callback<>>
+# @type limit: int
+# @param limit: maximum number of simultaneously running callbacks
+#
+# @return list<tuple<result, exc_info|None>> in order of callbacks
+def runConcurrently(callbacks, limit):
+    results = [None] * len(callbacks)
+
+    def run(index):
+        try:
+            results[index] = (callbacks[index](), None)
+        except Exception:
+            results[index] = (None, sys.exc_info())
+
+    # no need for threads
+    if len(callbacks) == 1 or limit <= 1:
+        for index in range(len(callbacks)):
+            run(index)
+
+        return results
+
+    pending = iter(range(len(callbacks)))
+    lock = threading.Lock()
+    threads = []
+
+    def work():
+        while True:
+            with lock:
+                index = next(pending, None)
+
+            if index is None:
+                return
+
+            run(index)
+
+    for i in range(min(limit, len(callbacks))):
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+# Runs callbacks submitted one by one using a fixed number of worker threads
+#
+# Submitting blocks while enough callbacks are waiting, so that a producer
+# can't get too far ahead of the workers
+class WorkerPool:
+
+    # Constructor
+    #
+    # @type self: WorkerPool
+    # @type limit: int
+    # @param limit: number of workers
+    def __init__(self, limit):
+        limit = max(1, limit)
+
+        self.tasks = Queue.Queue(limit * 2)
+        self.errors = []
+        self.threads = []
+
+        for i in range(limit):
+            thread = threading.Thread(target=self.__work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+
+    # Schedules a callback
+    #
+    # @type self: WorkerPool
+    # @type callback: callback<>
+    def submit(self, callback):
+        self.tasks.put(callback)
+
+
+    # Schedules a callback unless it would have to wait
+    #
+    # @type self: WorkerPool
+    # @type callback: callback<>
+    #
+    # @return bool whether it was scheduled
+    def offer(self, callback):
+        try:
+            self.tasks.put_nowait(callback)
+        except Queue.Full:
+            return False
+
+        return True
+
+
+    # Waits until all submitted callbacks finish and stops the workers
+    #
+    # @type self: WorkerPool
+    #
+    # @return list<exc_info> of failed callbacks
+    def join(self):
+        for thread in self.threads:
+            self.tasks.put(None)
+
+        for thread in self.threads:
+            thread.join()
+
+        return self.errors
+
+
+    # Runs callbacks until told to stop
+    #
+    # @type self: WorkerPool
+    def __work(self):
+        while True:
+            callback = self.tasks.get()
+
+            if callback is None:
+                return
+
+            try:
+                callback()
+            except Exception:
+                self.errors.append(sys.exc_info())
@@ -30,13 +30,21 @@
 # ==== Libraries ===========================================================================
 
 # Python's built-in libraries
+import calendar
 import ftplib
 import os
+import posixpath
+import Queue
+import random
 import re
+import socket
+import sys
+import threading
 import time
 
 # FTPSync libraries
-from ftpsyncfiles import Metafile, isTextFile
+from ftpsyncfiles import Metafile, isTextFile, replaceFile
+from ftpsyncjournal import getJournal
 
 
 # ==== Initialization and optimization =====================================================
@@ -50,8 +58,14 @@ re_errorCode = re.compile("[1-5]\d\d")
 # 20x ok code
 re_errorOk = re.compile("2\d\d");
 
-# For FTP LIST entries with {last modified} timestamp earlier than 6 months, see http://stackoverflow.com/questions/2443007/ftp-list-format
-currentYear = int(time.strftime("%Y", time.gmtime()))
+# month abbreviations in FTP LIST entries, see http://stackoverflow.com/questions/2443007/ftp-list-format
+monthNumbers = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+# offsets of local time from UTC, (year, month, day, hour) => seconds
+utcOffsets = {}
 
 # List of FTP errors of interest
 ftpError = {
@@ -81,6 +95,52 @@ sslErrors = {
 # Default permissions for newly created folder
 defaultFolderPermissions = "755"
 
+# FTP codes of transient errors worth retrying after reconnect
+# 421 service closing control connection, 425 can't open data connection, 426 transfer aborted
+transientErrorCodes = [421, 425, 426]
+
+# upper bound of a delay between retries [seconds]
+retryDelayLimit = 10
+
+# resolved addresses of hosts, (host, port) => (address, time of resolution)
+dnsCache = {}
+
+# how long a resolved address is used [seconds]
+dnsCacheTtl = 300
+
+# files at least this large are transferred resumably [bytes]
+resumeThreshold = 1048576
+
+# block size transfers start with when tuned automatically [bytes]
+defaultBlockSize = 8192
+
+# largest block size automatic tuning may reach [bytes]
+maximumBlockSize = 1048576
+
+# only transfers at least this large are measured for tuning [bytes]
+blockTuningMinimum = 262144
+
+# automatically tuned block sizes, (host, port) => BlockSizeTuner
+blockSizeTuners = {}
+
+# files at least this large are read ahead in a separate thread while uploading [bytes]
+readAheadThreshold = 1048576
+
+# number of blocks read ahead
+readAheadBlocks = 8
+
+# suffix of a file a download is written into before it replaces the target
+partialSuffix = '.ftpsyncpart'
+
+# number of listed entries waiting to be taken when listing is streamed
+listingQueueSize = 256
+
+# codes meaning the server does not implement a command (or its parameters)
+unsupportedErrorCodes = [500, 501, 502, 504]
+
+# codes meaning the server does not know a command at all,
+# 501 is also used for arguments the command can't take (MLSD of a file)
+unknownCommandErrorCodes = [500, 502]
 
 
 # ==== Exceptions ==========================================================================
@@ -94,6 +154,236 @@ class TargetAlreadyExists(Exception):
 
 # ==== Content =============================================================================
 
+# Tunes block size of transfers to a server
+#
+# Doubles the block size while throughput of large transfers improves,
+# steps back and settles once it stops improving
+class BlockSizeTuner:
+
+    # Constructor
+    #
+    # @type self: BlockSizeTuner
+    #
+    # @global defaultBlockSize
+    def __init__(self):
+        self.blockSize = defaultBlockSize
+        self.lastThroughput = None
+        self.isSettled = False
+        self.lock = threading.Lock()
+
+
+    # Returns block size to use
+    #
+    # @type self: BlockSizeTuner
+    #
+    # @return int
+    def getBlockSize(self):
+        return self.blockSize
+
+
+    # Records a finished transfer
+    #
+    # @type self: BlockSizeTuner
+    # @type blockSize: int
+    # @param blockSize: block size the transfer used
+    # @type transferred: int
+    # @param transferred: bytes transferred
+    # @type elapsed: float
+    # @param elapsed: duration of the transfer [seconds]
+    #
+    # @global maximumBlockSize
+    # @global blockTuningMinimum
+    def record(self, blockSize, transferred, elapsed):
+        if transferred < blockTuningMinimum or elapsed <= 0:
+            return
+
+        throughput = transferred / elapsed
+
+        with self.lock:
+            # measured with outdated block size
+            if self.isSettled or blockSize != self.blockSize:
+                return
+
+            if self.lastThroughput is not None and throughput <= self.lastThroughput * 1.05:
+                self.blockSize = max(defaultBlockSize, self.blockSize // 2)
+                self.isSettled = True
+                return
+
+            self.lastThroughput = throughput
+
+            if self.blockSize < maximumBlockSize:
+                self.blockSize *= 2
+            else:
+                self.isSettled = True
+
+
+# Returns block size tuner shared by all sessions to a server
+#
+# @type host: string
+# @type port: int
+#
+# @return BlockSizeTuner
+#
+# @global blockSizeTuners
+def getBlockSizeTuner(host, port):
+    key = (host.lower(), int(port))
+
+    if key not in blockSizeTuners:
+        blockSizeTuners[key] = BlockSizeTuner()
+
+    return blockSizeTuners[key]
+
+
+# Cache of remote listings shared by all sessions
+#
+# Listings are keyed by server and remote path (of a folder or of a single file),
+# own changes of the remote are written through instead of invalidating
+class ListingCache:
+
+    # Constructor
+    #
+    # @type self: ListingCache
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+
+    # Returns a cached listing of a path
+    #
+    # @type self: ListingCache
+    # @type endpoint: tuple
+    # @param endpoint: identification of the server
+    # @type path: string
+    # @param path: remote path
+    # @type ttl: int|float
+    # @param ttl: maximum age of the listing [seconds]
+    #
+    # @return list<Metafile>|None when not cached
+    def get(self, endpoint, path, ttl):
+        path = posixpath.normpath(path)
+
+        with self.lock:
+            cached = self.entries.get((endpoint, path))
+            if cached is not None and cached[0] >= time.time() - ttl:
+                return list(cached[1])
+
+        return None
+
+
+    # Returns a cached entry of a file, also from a cached listing of its folder
+    #
+    # Only for files, a folder's entry in its parent's listing is not its content
+    #
+    # @type self: ListingCache
+    # @type endpoint: tuple
+    # @param endpoint: identification of the server
+    # @type path: string
+    # @param path: remote path of a file
+    # @type ttl: int|float
+    # @param ttl: maximum age of the listing [seconds]
+    #
+    # @return list<Metafile>|None when not cached
+    def getFile(self, endpoint, path, ttl):
+        cached = self.get(endpoint, path, ttl)
+        if cached is not None:
+            return cached
+
+        path = posixpath.normpath(path)
+
+        with self.lock:
+            parent = self.entries.get((endpoint, posixpath.dirname(path)))
+            if parent is not None and parent[0] >= time.time() - ttl:
+                name = posixpath.basename(path)
+                return [entry for entry in parent[1] if entry.getName() == name]
+
+        return None
+
+
+    # Stores a fresh listing of a path
+    #
+    # @type self: ListingCache
+    # @type endpoint: tuple
+    # @type path: string
+    # @type listing: list<Metafile>
+    def store(self, endpoint, path, listing):
+        with self.lock:
+            self.entries[(endpoint, posixpath.normpath(path))] = (time.time(), list(listing))
+
+
+    # Records a file uploaded or a folder created
+    #
+    # @type self: ListingCache
+    # @type endpoint: tuple
+    # @type path: string
+    # @param path: remote path of the new entry
+    # @type entry: Metafile
+    def add(self, endpoint, path, entry):
+        path = posixpath.normpath(path)
+
+        with self.lock:
+            self.__addToParent(endpoint, path, entry)
+
+            if entry.isDirectory():
+                self.entries[(endpoint, path)] = (time.time(), [])
+            else:
+                self.entries[(endpoint, path)] = (time.time(), [entry])
+
+
+    # Records a rename of a file or a folder
+    #
+    # @type self: ListingCache
+    # @type endpoint: tuple
+    # @type path: string
+    # @param path: remote path before the rename
+    # @type new_path: string
+    # @param new_path: remote path after the rename
+    def move(self, endpoint, path, new_path):
+        path = posixpath.normpath(path)
+        new_path = posixpath.normpath(new_path)
+
+        with self.lock:
+            moved = None
+
+            parent = self.entries.get((endpoint, posixpath.dirname(path)))
+            if parent is not None:
+                name = posixpath.basename(path)
+
+                for entry in parent[1]:
+                    if entry.getName() == name:
+                        moved = entry
+
+                parent[1][:] = [entry for entry in parent[1] if entry.getName() != name]
+
+            # contents of renamed folders are not tracked
+            for key in list(self.entries):
+                if key[0] == endpoint and (key[1] in [path, new_path] or key[1].startswith(path + "/") or key[1].startswith(new_path + "/")):
+                    self.entries.pop(key)
+
+            if moved is not None:
+                moved = Metafile(posixpath.basename(new_path), moved.isDirectory(), moved.getLastModified(), moved.getFilesize())
+                self.__addToParent(endpoint, new_path, moved)
+            else:
+                # unknown entry, the new parent's listing can't be updated
+                self.entries.pop((endpoint, posixpath.dirname(new_path)), None)
+
+
+    # Replaces an entry in a cached listing of its folder, to be called under lock
+    #
+    # @type self: ListingCache
+    # @type endpoint: tuple
+    # @type path: string
+    # @type entry: Metafile
+    def __addToParent(self, endpoint, path, entry):
+        parent = self.entries.get((endpoint, posixpath.dirname(path)))
+
+        if parent is not None:
+            parent[1][:] = [cached for cached in parent[1] if cached.getName() != entry.getName()] + [entry]
+
+
+# remote listings shared by all sessions
+listingCache = ListingCache()
+
+
 # Factory function - returns and instance of a proper class based on the configuration
 # currently differs between FTP(S) and SFTP
 #
@@ -111,6 +401,125 @@ def CreateConnection(config, name):
         return FTPSConnection(config['connections'][name], config, name)
 
 
+# Returns an address of the host, resolved ones are cached
+#
+# Falls back to the host itself when it cannot be resolved
+#
+# @type host: string
+# @type port: int
+#
+# @return string
+#
+# @global dnsCache
+# @global dnsCacheTtl
+def resolveHost(host, port):
+    key = (host, int(port))
+    cached = dnsCache.get(key)
+
+    if cached is not None and time.time() - cached[1] < dnsCacheTtl:
+        return cached[0]
+
+    try:
+        address = socket.getaddrinfo(host, int(port), 0, socket.SOCK_STREAM)[0][4][0]
+    except socket.error:
+        if cached is not None:
+            return cached[0]
+
+        return host
+
+    dnsCache[key] = (address, time.time())
+
+    return address
+
+
+# Forgets a cached address of the host
+#
+# @type host: string
+# @type port: int
+#
+# @global dnsCache
+def forgetHost(host, port):
+    dnsCache.pop((host, int(port)), None)
+
+
+# Returns number of days since 1970-01-01 of a date in the proleptic Gregorian calendar
+#
+# @see http://howardhinnant.github.io/date_algorithms.html#days_from_civil
+#
+# @type year: int
+# @type month: int
+# @type day: int
+#
+# @return int
+def daysFromCivil(year, month, day):
+    if month <= 2:
+        year -= 1
+
+    era = year // 400
+    yearOfEra = year - era * 400
+    dayOfYear = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    dayOfEra = yearOfEra * 365 + yearOfEra // 4 - yearOfEra // 100 + dayOfYear
+
+    return era * 146097 + dayOfEra - 719468
+
+
+# Returns offset of local time from UTC at a given hour (cached)
+#
+# @type year: int
+# @type month: int
+# @type day: int
+# @type hour: int
+#
+# @return int seconds to add to local time to get UTC
+#
+# @global utcOffsets
+def getUtcOffset(year, month, day, hour):
+    key = (year, month, day, hour)
+
+    if key not in utcOffsets:
+        local = daysFromCivil(year, month, day) * 86400 + hour * 3600
+        utcOffsets[key] = int(time.mktime((year, month, day, hour, 0, 0, 0, 0, -1))) - local
+
+    return utcOffsets[key]
+
+
+# Parses time of a FTP LIST entry as local time, "Mon DD HH:MM" (within last 6 months) or "Mon DD YYYY"
+#
+# @type value: string
+# @type today: time.struct_time
+# @param today: current local time, to decide the year of recent entries
+#
+# @return int unix timestamp
+#
+# @global monthNumbers
+#
+# @throws ValueError for an unknown format
+def parseListTime(value, today):
+    parts = value.split()
+    month = monthNumbers.get(parts[0][:3].lower())
+
+    if month is None or len(parts) != 3:
+        raise ValueError("Unknown LIST time format: " + value)
+
+    day = int(parts[1])
+
+    if parts[2].find(':') == -1:
+        year = int(parts[2])
+        hour = 0
+        minute = 0
+    else:
+        hour, minute = parts[2].split(':')
+        hour = int(hour)
+        minute = int(minute)
+
+        # recent entries are not from the future, otherwise it's last year's
+        year = today.tm_year
+        if (month, day) > (today.tm_mon, today.tm_mday + 1):
+            year -= 1
+
+    return daysFromCivil(year, month, day) * 86400 + hour * 3600 + minute * 60 + getUtcOffset(year, month, day, hour)
+
+
 # Base class for all connection classes
 class AbstractConnection:
 
@@ -161,15 +570,27 @@ class FTPSConnection(AbstractConnection):
     # @type name: string
     # @param name: connection name from config
     def __init__(self, config, generic_config, name):
-        self.config = config
-        self.generic_config = generic_config
-        self.name = name
+        self.bind(config, generic_config, name)
         self.isClosed = False
-
-        if self.config['tls'] is True:
-            self.connection = ftplib.FTP_TLS()
-        else:
-            self.connection = ftplib.FTP()
+        # current remote directory as far as known
+        self.workingDirectory = None
+        # number of reconnects needed by the last action
+        self.lastRetries = 0
+        # time of the last issued command other than keep-alive
+        self.lastActivity = time.time()
+        # time of the last keep-alive message
+        self.lastKeepAlive = self.lastActivity
+        # bytes transferred and timeouts since the last statistics were taken
+        self.transferredBytes = 0
+        self.timeouts = 0
+        # offset the last transfer was resumed from
+        self.lastResumed = 0
+        # os.stat_result of the last uploaded file as it was sent
+        self.lastSent = None
+        # extensions the server advertises in FEAT, None = not asked yet
+        self.features = None
+
+        self.connection = self.__createClient()
 
 
     # Destructor, closes connection
@@ -180,11 +601,52 @@ class FTPSConnection(AbstractConnection):
             self.close()
 
 
+    # Assigns the session to a remote, sessions are shared among remotes
+    # connecting to the same server with the same credentials
+    #
+    # @type self: FTPSConnection
+    # @type config: dict
+    # @param config: only the connection part of config
+    # @type generic_config: dict
+    # @type name: string
+    # @param name: connection name from config
+    def bind(self, config, generic_config, name):
+        self.config = config
+        self.generic_config = generic_config
+        self.name = name
+
+
+    # Returns identification of the remote the session is assigned to
+    #
+    # @type self: FTPSConnection
+    #
+    # @return tuple (config fingerprint, connection name)
+    def getBinding(self):
+        return (self.generic_config.get('fingerprint'), self.name)
+
+
+    # Returns current remote directory or None if not known
+    #
+    # @type self: FTPSConnection
+    #
+    # @return string|None
+    def getWorkingDirectory(self):
+        return self.workingDirectory
+
+
     # Connects to remote server
     #
     # @type self: FTPSConnection
     def connect(self):
-        self.connection.connect(self.config['host'], int(self.config['port']), int(self.config['timeout']))
+        address = resolveHost(self.config['host'], self.config['port'])
+
+        try:
+            self.connection.connect(address, int(self.config['port']), int(self.config['timeout']))
+        except Exception:
+            # the address might have changed
+            forgetHost(self.config['host'], self.config['port'])
+            raise
+
         self.connection.set_pasv(self.config['passive'])
 
 
@@ -209,11 +671,92 @@ class FTPSConnection(AbstractConnection):
         self.connection.login(self.config['username'], self.config['password'])
 
 
+    # Replaces the session with a freshly connected and logged in one
+    #
+    # @type self: FTPSConnection
+    def reconnect(self):
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+        self.connection = self.__createClient()
+        self.isClosed = False
+        self.workingDirectory = None
+
+        self.connect()
+        self.authenticate()
+
+        if self.config['username'] is not None:
+            self.login()
+
+        self.cwd(self.config['path'])
+
+
+    # Returns how many times the last action had to reconnect and retry
+    #
+    # @type self: FTPSConnection
+    #
+    # @return int
+    def getLastRetries(self):
+        return self.lastRetries
+
+
+    # Returns offset the last transfer was resumed from, 0 if not resumed
+    #
+    # @type self: FTPSConnection
+    #
+    # @return int
+    def getLastResumed(self):
+        return self.lastResumed
+
+
+    # Returns state of the last uploaded file as it was when being sent
+    #
+    # @type self: FTPSConnection
+    #
+    # @return os.stat_result|None
+    def getLastSent(self):
+        return self.lastSent
+
+
+    # Returns and resets transfer statistics
+    #
+    # @type self: FTPSConnection
+    #
+    # @return tuple (bytes transferred, number of timeouts)
+    def takeTransferStats(self):
+        stats = (self.transferredBytes, self.timeouts)
+        self.transferredBytes = 0
+        self.timeouts = 0
+
+        return stats
+
+
     # Send an empty/keep-alive message to server
     #
     # @type self: FTPSConnection
     def keepAlive(self):
         self.connection.voidcmd("NOOP")
+        self.lastKeepAlive = time.time()
+
+
+    # Returns number of seconds since the last command other than keep-alive
+    #
+    # @type self: FTPSConnection
+    #
+    # @return float
+    def getIdleTime(self):
+        return time.time() - self.lastActivity
+
+
+    # Returns number of seconds since the last command including keep-alive
+    #
+    # @type self: FTPSConnection
+    #
+    # @return float
+    def getSilentTime(self):
+        return time.time() - max(self.lastActivity, self.lastKeepAlive)
 
 
     # Returns whether the connection is active
@@ -237,6 +780,7 @@ class FTPSConnection(AbstractConnection):
                 remote_file = self._postprocessPath(os.path.join(os.path.split(file_path)[0], new_name))
 
             path = self._getMappedPath(remote_file)
+            self.lastSent = None
 
             if os.path.isdir(file_path):
                 return self.__ensurePath(path, True)
@@ -244,11 +788,36 @@ class FTPSConnection(AbstractConnection):
             command = "STOR " + path
             uploaded = open(file_path, "rb")
 
+            # large files are journaled to be resumed when interrupted
+            journal = self.__getJournal()
+            key = self.name + " " + command
+            stat = os.fstat(uploaded.fileno())
+            entry = {"local": file_path, "size": stat.st_size, "mtime": stat.st_mtime}
+            resumable = stat.st_size >= resumeThreshold
+
+            # journaled only once the server accepted the transfer and started writing,
+            # an attempt failing before that leaves the remote file as it was
+            def accepted():
+                if resumable:
+                    journal.start(key, dict(entry, offset=self.lastResumed))
+
             try:
-                self.connection.storbinary(command, uploaded)
+                offset = 0
+                if resumable:
+                    offset = self.__getUploadOffset(journal.get(key), entry, path)
+
+                self.lastResumed = offset
+                uploaded.seek(offset)
+                self.__store(command, uploaded, offset, accepted)
+                self.transferredBytes += uploaded.tell() - self.lastResumed
+                self.lastSent = stat
+                journal.finish(key)
+
+                # stamped with the local time so that own upload doesn't look like a newer remote version
+                listingCache.add(self.__getEndpoint(), path, Metafile(posixpath.basename(path), False, stat.st_mtime, stat.st_size))
             except Exception, e:
                 if self.__isErrorCode(e, ['ok', 'passive']) is True:
-                    pass
+                    journal.finish(key)
                 elif self.__isErrorCode(e, 'fileUnavailible') and failed is False:
                     self.__ensurePath(path)
                     self.put(file_path, new_name, True)
@@ -267,24 +836,73 @@ class FTPSConnection(AbstractConnection):
     #
     # @type self: FTPSConnection
     # @type file_path: string
-    def get(self, file_path):
+    # @type size: int|float|None
+    # @param size: remote size if already known (from a listing)
+    def get(self, file_path, size=None):
 
         def action():
             path = self._getMappedPath(file_path)
             command = "RETR " + path
-            downloaded = open(file_path, "wb")
 
-            downloaded = open(file_path, "wb")
+            # written aside, the target is replaced only by a complete file
+            partial = file_path + partialSuffix
+
+            # journaled once large enough to be worth resuming when interrupted,
+            # along with the remote file's size and time so that a changed one is not spliced
+            journal = self.__getJournal()
+            key = self.name + " " + command
+            journaled = journal.get(key)
+
+            # files known to be small are not asked about, a previous attempt is always verified
+            if journaled is None and size is not None:
+                entry = {"local": file_path, "remote": self.__getResumeState(path, size)}
+            else:
+                entry = {"local": file_path, "remote": self.__getResumeState(path)}
+            offset = self.__getDownloadOffset(journaled, entry, partial)
+            written = [offset]
+
+            if journaled is not None and journaled != entry:
+                journal.finish(key)
+
+            self.lastResumed = offset
+            if offset > 0:
+                downloaded = open(partial, "ab")
+            else:
+                downloaded = open(partial, "wb")
+
+            def write(data):
+                downloaded.write(data)
+                self.transferredBytes += len(data)
+
+                if written[0] < resumeThreshold <= written[0] + len(data) and entry['remote'] is not None:
+                    journal.start(key, entry)
+
+                written[0] += len(data)
+
+            completed = False
+
             try:
-                self.connection.retrbinary(command, lambda data: downloaded.write(data))
-            except Exception, e:
-                if self.__isErrorCode(e, ['ok', 'passive']):
-                    self.connection.retrbinary(command, lambda data: downloaded.write(data))
-                else:
-                    raise
+                try:
+                    self.__retrieve(command, write, offset, downloaded)
+                except Exception, e:
+                    if self.__isErrorCode(e, ['ok', 'passive']):
+                        self.connection.retrbinary(command, write)
+                    else:
+                        raise
+
+                downloaded.flush()
+                os.fsync(downloaded.fileno())
+                completed = True
             finally:
                 downloaded.close()
 
+                # kept only when it can be resumed
+                if completed is False and journal.get(key) is None and os.path.exists(partial):
+                    os.remove(partial)
+
+            replaceFile(partial, file_path)
+            journal.finish(key)
+
         return self.__execute(action)
 
 
@@ -322,11 +940,15 @@ class FTPSConnection(AbstractConnection):
                     else:
                         raise
 
+            def renameTo():
+                self.connection.voidcmd("RNTO " + new_name)
+                listingCache.move(self.__getEndpoint(), posixpath.join(path, base), posixpath.join(path, new_name))
+
             try:
                 self.connection.voidcmd("RNFR " + base)
             except Exception, e:
                 if self.__isError(e, 'rnfrExists'):
-                    self.connection.voidcmd("RNTO " + new_name)
+                    renameTo()
                     return
                 elif self.__isError(e, 'cwdNoFileOrDirectory') or self.__isError(e, 'fileNotExist'):
                     if is_dir:
@@ -341,14 +963,14 @@ class FTPSConnection(AbstractConnection):
                 self.connection.voidcmd("RNFR " + base)
             except Exception, e:
                 if self.__isError(e, 'rnfrExists') and str(e).find('Aborting previous'):
-                    self.connection.voidcmd("RNTO " + new_name)
+                    renameTo()
                     return
                 else:
                     raise
 
-            self.connection.voidcmd("RNTO " + new_name)
+            renameTo()
 
-        return self.__execute(action)
+        return self.__execute(action, False)
 
 
     # Changes a current path on remote server
@@ -356,55 +978,403 @@ class FTPSConnection(AbstractConnection):
     # @type self: FTPSConnection
     # @type path: string
     def cwd(self, path):
+        self.workingDirectory = None
         self.connection.cwd(path)
+        self.workingDirectory = path
+        self.lastActivity = time.time()
 
 
     # Returns a list of content of a given path
     #
+    # Listings are cached for {listing_cache_ttl} seconds
+    #
     # @type self: FTPSConnection
     # @type file_path: string
+    # @type forced: bool
+    # @param forced: bypass the cache
     #
     # @return list<Metafile>
-    def list(self, file_path):
+    #
+    # @global listingCache
+    def list(self, file_path, forced=False):
+        path = self._getMappedPath(file_path)
+        ttl = self.config['listing_cache_ttl']
 
-        def action():
-            path = self._getMappedPath(file_path)
-            contents = []
-            result = []
+        if forced is False and ttl > 0:
+            cached = listingCache.get(self.__getEndpoint(), path, ttl)
 
-            try:
-                self.connection.dir(path, lambda data: contents.append(data))
-            except Exception, e:
-                if self.__isErrorCode(e, ['ok', 'passive']):
-                    self.connection.dir(path, lambda data: contents.append(data))
-                else:
-                    raise
+            if cached is not None:
+                return cached
+
+        result = self.__list(file_path)
+
+        if ttl > 0:
+            listingCache.store(self.__getEndpoint(), path, result)
 
-            for content in contents:
+        return result
+
+
+    # Returns metadata of a single file using only the control connection
+    #
+    # Uses MLST, or MDTM and SIZE, falls back to listing when the server supports neither;
+    # results are cached the same way as listings
+    #
+    # @type self: FTPSConnection
+    # @type file_path: string
+    # @type forced: bool
+    # @param forced: bypass the cache
+    #
+    # @return list<Metafile> with at most one entry
+    #
+    # @global listingCache
+    def probe(self, file_path, forced=False):
+        if os.path.isdir(file_path):
+            return self.list(file_path, forced)
+
+        path = self._getMappedPath(file_path)
+        ttl = self.config['listing_cache_ttl']
+
+        if forced is False and ttl > 0:
+            cached = listingCache.getFile(self.__getEndpoint(), path, ttl)
+
+            if cached is not None:
+                return cached
+
+        def action():
+            if self.__hasFeature('MLST'):
                 try:
-                    if self.config['debug_extras']['print_list_result'] is True:
-                        print "FTPSync <debug> LIST line: " + str(content)
-                except KeyError:
-                    pass
+                    return self.__probeFacts(path)
+                except ftplib.error_perm, e:
+                    if self.__isUnsupported(e) is False:
+                        raise
 
-                split = re_ftpListParse.search(content)
+                    if self.__isUnsupported(e, unknownCommandErrorCodes):
+                        self.features.discard('MLST')
 
-                if split is None:
-                    continue
+            if self.__hasFeature('MDTM') and self.__hasFeature('SIZE'):
+                return self.__probeTimeAndSize(path)
 
-                isDir = split.group(1) == 'd'
-                filesize = split.group(2)
-                lastModified = split.group(3)
-                name = split.group(4)
+            return None
 
-                data = Metafile(name, isDir, self.__parseTime(lastModified) + int(self.config['time_offset']), filesize)
+        result = self.__execute(action)
 
-                if name != "." and name != "..":
-                    result.append(data)
+        if result is None:
+            result = self.__list(file_path)
 
-            return result
+        if ttl > 0:
+            listingCache.store(self.__getEndpoint(), path, result)
 
-        return self.__execute(action)
+        return result
+
+
+    # Returns metadata of a file using MLST
+    #
+    # @type self: FTPSConnection
+    # @type path: string
+    # @param path: remote path
+    #
+    # @return list<Metafile>
+    def __probeFacts(self, path):
+        try:
+            response = self.connection.sendcmd("MLST " + path)
+        except ftplib.error_perm, e:
+            if self.__isErrorCode(e, 'fileUnavailible'):
+                return []
+
+            raise
+
+        # the entry is the indented line between "250-" and "250 "
+        for line in response.split("\n")[1:]:
+            if line.startswith(" "):
+                entry = self.__parseFacts(line[1:])
+
+                if entry is not None:
+                    return [entry]
+
+        return []
+
+
+    # Returns metadata of a file using MDTM and SIZE, None when they can't tell
+    #
+    # @type self: FTPSConnection
+    # @type path: string
+    # @param path: remote path
+    #
+    # @return list<Metafile>|None
+    def __probeTimeAndSize(self, path):
+        try:
+            modified = self.connection.sendcmd("MDTM " + path)
+        except ftplib.error_perm, e:
+            if self.__isErrorCode(e, 'fileUnavailible'):
+                return []
+            if self.__isUnsupported(e):
+                return None
+
+            raise
+
+        try:
+            size = self.connection.size(path)
+        except ftplib.error_perm:
+            # some servers refuse SIZE in ASCII mode
+            try:
+                self.connection.voidcmd("TYPE I")
+                size = self.connection.size(path)
+            except ftplib.error_perm:
+                return None
+
+        if size is None:
+            return None
+
+        return [Metafile(posixpath.basename(path), False, self.__parseFactTime(modified[4:].strip()), size)]
+
+
+    # Returns a list of content of a given path from the server
+    #
+    # @type self: FTPSConnection
+    # @type file_path: string
+    #
+    # @return list<Metafile>
+    def __list(self, file_path):
+        path = self._getMappedPath(file_path)
+
+        def action():
+            result = []
+            self.__listEntries(path, result.append)
+
+            return result
+
+        return self.__execute(action)
+
+
+    # Yields content of a given path while it's being listed
+    #
+    # Entries are parsed as soon as they arrive and at most {listingQueueSize} of them
+    # wait to be taken, the session stays busy until the generator is exhausted or closed
+    #
+    # @type self: FTPSConnection
+    # @type file_path: string
+    # @type forced: bool
+    # @param forced: bypass the cache
+    #
+    # @return generator<Metafile>
+    #
+    # @global listingCache
+    # @global listingQueueSize
+    def iterList(self, file_path, forced=False):
+        path = self._getMappedPath(file_path)
+        ttl = self.config['listing_cache_ttl']
+
+        if forced is False and ttl > 0:
+            cached = listingCache.get(self.__getEndpoint(), path, ttl)
+
+            if cached is not None:
+                for entry in cached:
+                    yield entry
+
+                return
+
+        entries = Queue.Queue(listingQueueSize)
+        stopped = threading.Event()
+        emitted = [0]
+
+        def action():
+            passed = emitted[0]
+            skipped = [0]
+
+            def emit(entry):
+                # already passed on before a reconnect
+                if skipped[0] < passed:
+                    skipped[0] += 1
+                    return
+
+                self.__offer(entries, stopped, entry)
+                emitted[0] += 1
+
+            self.__listEntries(path, emit)
+
+        def produce():
+            try:
+                self.__execute(action)
+                self.__offer(entries, stopped, None)
+            except Exception:
+                self.__offer(entries, stopped, sys.exc_info())
+
+        producer = threading.Thread(target=produce)
+        producer.daemon = True
+        producer.start()
+
+        try:
+            while True:
+                entry = entries.get()
+
+                if entry is None:
+                    return
+                if type(entry) is tuple:
+                    raise entry[0], entry[1], entry[2]
+
+                yield entry
+        finally:
+            stopped.set()
+            producer.join()
+
+
+    # Lists a folder, passes entries to callback as they arrive
+    #
+    # @type self: FTPSConnection
+    # @type path: string
+    # @param path: remote path
+    # @type callback: callback<Metafile>
+    def __listEntries(self, path, callback):
+        # machine-readable listing with exact times
+        if self.__hasFeature('MLST'):
+            try:
+                return self.__listFacts(path, callback)
+            except ftplib.error_perm, e:
+                # missing folder, LIST would return nothing
+                if self.__isErrorCode(e, 'fileUnavailible'):
+                    return
+
+                if self.__isUnsupported(e) is False:
+                    raise
+
+                # unknown to the server for good, otherwise only this path is listed the old way
+                if self.__isUnsupported(e, unknownCommandErrorCodes):
+                    self.features.discard('MLST')
+
+        debug = self.__isDebugging('print_list_result')
+        offset = int(self.config['time_offset'])
+        today = time.localtime()
+
+        def parse(content):
+            if debug:
+                print "FTPSync <debug> LIST line: " + str(content)
+
+            split = re_ftpListParse.search(content)
+
+            if split is None:
+                return
+
+            name = split.group(4)
+
+            if name != "." and name != "..":
+                callback(Metafile(name, split.group(1) == 'd', parseListTime(split.group(3), today) + offset, split.group(2)))
+
+        try:
+            self.connection.dir(path, parse)
+        except Exception, e:
+            if self.__isErrorCode(e, ['ok', 'passive']):
+                self.connection.dir(path, parse)
+            else:
+                raise
+
+
+    # Lists a folder using MLSD, passes entries to callback as they arrive
+    #
+    # @type self: FTPSConnection
+    # @type path: string
+    # @param path: remote path
+    # @type callback: callback<Metafile>
+    def __listFacts(self, path, callback):
+        debug = self.__isDebugging('print_list_result')
+
+        def parse(content):
+            if debug:
+                print "FTPSync <debug> MLSD line: " + str(content)
+
+            data = self.__parseFacts(content)
+
+            if data is not None:
+                callback(data)
+
+        self.connection.retrlines("MLSD " + path, parse)
+
+
+    # Parses a MLSD/MLST entry "fact=value;fact=value; name"
+    #
+    # @see https://tools.ietf.org/html/rfc3659#section-7
+    #
+    # @type self: FTPSConnection
+    # @type line: string
+    #
+    # @return Metafile|None for entries of the folder itself and its parent
+    def __parseFacts(self, line):
+        if line.find(' ') == -1:
+            return None
+
+        facts, name = line.split(' ', 1)
+        values = {}
+
+        for fact in facts.split(';'):
+            if fact.find('=') != -1:
+                key, value = fact.split('=', 1)
+                values[key.lower()] = value
+
+        kind = values.get('type', 'file').lower()
+        if kind == 'cdir' or kind == 'pdir' or name == '.' or name == '..':
+            return None
+
+        lastModified = 0
+        if 'modify' in values:
+            lastModified = self.__parseFactTime(values['modify'])
+
+        return Metafile(posixpath.basename(name), kind == 'dir', lastModified, values.get('size', 0))
+
+
+    # Parses a MLSD/MLST time value YYYYMMDDHHMMSS[.sss] in UTC
+    #
+    # @type self: FTPSConnection
+    # @type value: string
+    #
+    # @return float unix timestamp
+    def __parseFactTime(self, value):
+        seconds = calendar.timegm((int(value[0:4]), int(value[4:6]), int(value[6:8]), int(value[8:10]), int(value[10:12]), int(value[12:14]), 0, 0, 0))
+
+        if len(value) > 15 and value[14] == '.':
+            seconds += float("0" + value[14:])
+
+        return seconds
+
+
+    # Returns whether the server advertises an extension in FEAT
+    #
+    # @type self: FTPSConnection
+    # @type feature: string
+    #
+    # @return bool
+    def __hasFeature(self, feature):
+        if self.features is None:
+            self.features = set()
+
+            try:
+                response = self.connection.sendcmd("FEAT")
+            except (ftplib.error_perm, ftplib.error_reply):
+                return False
+
+            # features are indented lines between "211-" and "211 "
+            for line in response.split("\n")[1:]:
+                if line.startswith(" "):
+                    self.features.add(line.strip().split(" ")[0].upper())
+
+        return feature in self.features
+
+
+    # Returns whether the error means the command is not implemented
+    #
+    # @type self: FTPSConnection
+    # @type exception: Exception
+    # @type codes: list<int>|None
+    # @param codes: error codes meaning so, None = unsupportedErrorCodes
+    #
+    # @return bool
+    #
+    # @global unsupportedErrorCodes
+    def __isUnsupported(self, exception, codes=None):
+        if codes is None:
+            codes = unsupportedErrorCodes
+
+        code = re_errorCode.search(str(exception))
+
+        return code is not None and int(code.group(0)) in codes
 
 
     # Closes a connection
@@ -440,11 +1410,64 @@ class FTPSConnection(AbstractConnection):
 
     # Executes an action while handling common errors
     #
+    # Idempotent actions are replayed on a new session when the current one drops,
+    # at most {retry_attempts} times with exponentially growing randomized delay
+    #
+    # @type self: FTPSConnection
+    # @type callback: callback
+    # @type idempotent: bool
+    # @param idempotent: whether the action may be safely repeated
+    #
+    # @return unknown
+    def __execute(self, callback, idempotent=True):
+        self.lastRetries = 0
+
+        try:
+            while True:
+                try:
+                    return self.__executeOnce(callback)
+                except Exception, e:
+                    if idempotent is False or self.__isTransient(e) is False:
+                        raise
+
+                    self.__recover(e)
+        finally:
+            self.lastActivity = time.time()
+
+
+    # Reconnects after a transient error, raises when out of attempts
+    #
+    # @type self: FTPSConnection
+    # @type exception: Exception
+    # @param exception: error that caused the reconnect
+    def __recover(self, exception):
+        while True:
+            if self.lastRetries >= int(self.config['retry_attempts']):
+                raise exception
+
+            self.lastRetries += 1
+
+            # full jitter
+            delay = min(retryDelayLimit, float(self.config['retry_delay']) * (2 ** (self.lastRetries - 1)))
+            time.sleep(random.uniform(0, delay))
+
+            try:
+                self.reconnect()
+                return
+            except Exception, e:
+                if self.__isTransient(e) is False:
+                    raise
+
+                exception = e
+
+
+    # Executes an action once while handling common errors
+    #
     # @type self: FTPSConnection
     # @type callback: callback
     #
     # @return unknown
-    def __execute(self, callback):
+    def __executeOnce(self, callback):
         try:
             return callback()
         except Exception, e:
@@ -460,12 +1483,368 @@ class FTPSConnection(AbstractConnection):
                 raise
             # timeout - retry
             elif self.__isError(e, 'timeout') is True:
+                self.timeouts += 1
                 return callback()
             # other exception
             else:
                 raise
 
 
+    # Returns identification of the server for shared caches
+    #
+    # @type self: FTPSConnection
+    #
+    # @return tuple
+    def __getEndpoint(self):
+        return (self.config['host'].lower(), int(self.config['port']), self.config['username'])
+
+
+    # Returns journal of unfinished transfers of the remote
+    #
+    # @type self: FTPSConnection
+    #
+    # @return TransferJournal
+    def __getJournal(self):
+        return getJournal(os.path.dirname(self.config['file_path']))
+
+
+    # Returns remote size of a file, None if the server can't tell
+    #
+    # @type self: FTPSConnection
+    # @type path: string
+    # @param path: remote path
+    #
+    # @return int|None
+    def __getRemoteSize(self, path):
+        try:
+            return self.connection.size(path)
+        except (ftplib.error_perm, ftplib.error_reply):
+            return None
+
+
+    # Returns size and modification time of a remote file large enough to be resumed
+    #
+    # @type self: FTPSConnection
+    # @type path: string
+    # @param path: remote path
+    # @type size: int|float|None
+    # @param size: remote size if already known, None = ask the server
+    #
+    # @return dict|None None when too small or the server can't tell
+    #
+    # @global resumeThreshold
+    def __getResumeState(self, path, size=None):
+        if size is None:
+            size = self.__getRemoteSize(path)
+        else:
+            size = int(size)
+
+        if size is None or size < resumeThreshold:
+            return None
+
+        try:
+            modified = self.connection.sendcmd("MDTM " + path)
+        except (ftplib.error_perm, ftplib.error_reply):
+            return None
+
+        return {"size": size, "mtime": modified[4:].strip()}
+
+
+    # Returns offset to resume an upload from, 0 to upload whole file
+    #
+    # @type self: FTPSConnection
+    # @type journaled: dict|None
+    # @param journaled: journal entry of the previous attempt
+    # @type entry: dict
+    # @param entry: journal entry of the local file as it is now
+    # @type path: string
+    # @param path: remote path
+    #
+    # @return int
+    def __getUploadOffset(self, journaled, entry, path):
+        # no previous attempt the server started writing
+        if journaled is None or 'offset' not in journaled:
+            return 0
+
+        # the file has changed since
+        for name in entry:
+            if journaled.get(name) != entry[name]:
+                return 0
+
+        # shorter than when the attempt started writing means replaced meanwhile
+        size = self.__getRemoteSize(path)
+        if size is None or size < journaled['offset'] or size >= entry['size']:
+            return 0
+
+        return size
+
+
+    # Returns offset to resume a download from, 0 to download whole file
+    #
+    # @type self: FTPSConnection
+    # @type journaled: dict|None
+    # @param journaled: journal entry of the previous attempt
+    # @type entry: dict
+    # @param entry: journal entry of the download with the remote file as it is now
+    # @type file_path: string
+    # @param file_path: local path of the partial file
+    #
+    # @return int
+    def __getDownloadOffset(self, journaled, entry, file_path):
+        # no previous attempt or the remote file has changed since
+        if entry['remote'] is None or journaled != entry or os.path.isfile(file_path) is False:
+            return 0
+
+        offset = os.path.getsize(file_path)
+        if offset >= entry['remote']['size']:
+            return 0
+
+        return offset
+
+
+    # Uploads file contents from given offset, whole file if the server refuses to resume
+    #
+    # @type self: FTPSConnection
+    # @type command: string
+    # @type uploaded: file
+    # @param uploaded: file positioned at {offset}
+    # @type offset: int
+    # @type onAccepted: callback<>
+    # @param onAccepted: called once the server accepted the transfer and started writing
+    def __store(self, command, uploaded, offset, onAccepted):
+        blockSize = self.__getBlockSize()
+        started = time.time()
+
+        if offset == 0:
+            result = self.__storbinary(command, uploaded, blockSize, onAccepted)
+        else:
+            try:
+                result = self.__storbinary(command, uploaded, blockSize, onAccepted, offset)
+            except (ftplib.error_perm, ftplib.error_reply):
+                self.lastResumed = 0
+                uploaded.seek(0)
+                started = time.time()
+
+                result = self.__storbinary(command, uploaded, blockSize, onAccepted)
+
+        self.__recordBlockSize(blockSize, uploaded.tell() - self.lastResumed, time.time() - started)
+
+        return result
+
+
+    # Downloads file contents from given offset, whole file if the server refuses to resume
+    #
+    # @type self: FTPSConnection
+    # @type command: string
+    # @type callback: callback<data>
+    # @type offset: int
+    # @type downloaded: file
+    # @param downloaded: local file being written
+    def __retrieve(self, command, callback, offset, downloaded):
+        blockSize = self.__getBlockSize()
+        started = time.time()
+
+        if offset == 0:
+            result = self.__retrbinary(command, callback, blockSize)
+        else:
+            try:
+                result = self.__retrbinary(command, callback, blockSize, offset)
+            except (ftplib.error_perm, ftplib.error_reply):
+                self.lastResumed = 0
+                downloaded.seek(0)
+                downloaded.truncate()
+                started = time.time()
+
+                result = self.__retrbinary(command, callback, blockSize)
+
+        self.__recordBlockSize(blockSize, downloaded.tell() - self.lastResumed, time.time() - started)
+
+        return result
+
+
+    # Sends a file, large files are read ahead in a separate thread
+    #
+    # Same as ftplib's storbinary, but reading from disk overlaps with sending
+    # so a slow disk does not leave the connection idle and vice versa
+    #
+    # @type self: FTPSConnection
+    # @type command: string
+    # @type uploaded: file
+    # @type blockSize: int
+    # @type onAccepted: callback<>
+    # @param onAccepted: called once the server accepted the transfer
+    # @type rest: int|None
+    # @param rest: offset to start from
+    #
+    # @return string server response
+    #
+    # @global readAheadThreshold
+    def __storbinary(self, command, uploaded, blockSize, onAccepted, rest=None):
+        remaining = os.fstat(uploaded.fileno()).st_size - uploaded.tell()
+        if remaining < readAheadThreshold:
+            accepted = [False]
+
+            def sent(block):
+                if accepted[0] is False:
+                    accepted[0] = True
+                    onAccepted()
+
+            return self.connection.storbinary(command, uploaded, blockSize, sent, rest)
+
+        self.connection.voidcmd('TYPE I')
+        conn = self.connection.transfercmd(command, rest)
+        onAccepted()
+        blocks = Queue.Queue(readAheadBlocks)
+        stopped = threading.Event()
+
+        def read():
+            try:
+                while stopped.isSet() is False:
+                    block = uploaded.read(blockSize)
+                    self.__offer(blocks, stopped, block)
+
+                    if not block:
+                        return
+            except Exception:
+                self.__offer(blocks, stopped, sys.exc_info())
+
+        reader = threading.Thread(target=read)
+        reader.daemon = True
+        reader.start()
+
+        try:
+            while True:
+                block = blocks.get()
+
+                if type(block) is tuple:
+                    raise block[0], block[1], block[2]
+                if not block:
+                    break
+
+                conn.sendall(block)
+
+            # shutdown ssl layer
+            if hasattr(conn, 'unwrap'):
+                conn.unwrap()
+        finally:
+            stopped.set()
+            conn.close()
+            reader.join()
+
+        return self.connection.voidresp()
+
+
+    # Puts an item into a queue unless its consumer has stopped
+    #
+    # @type self: FTPSConnection
+    # @type items: Queue.Queue
+    # @type stopped: threading.Event
+    # @type item: mixed
+    # @param item: data, end marker or exc_info on error
+    def __offer(self, items, stopped, item):
+        while stopped.isSet() is False:
+            try:
+                items.put(item, True, 0.1)
+                return
+            except Queue.Full:
+                pass
+
+
+    # Receives a file into a single reusable buffer
+    #
+    # Same as ftplib's retrbinary, but without allocating a new string for every block,
+    # callback gets a read-only view of the buffer valid only until it returns
+    #
+    # @type self: FTPSConnection
+    # @type command: string
+    # @type callback: callback<buffer>
+    # @type blockSize: int
+    # @type rest: int|None
+    # @param rest: offset to start from
+    #
+    # @return string server response
+    def __retrbinary(self, command, callback, blockSize, rest=None):
+        self.connection.voidcmd('TYPE I')
+        conn = self.connection.transfercmd(command, rest)
+        block = bytearray(blockSize)
+
+        try:
+            while True:
+                received = conn.recv_into(block)
+                if received == 0:
+                    break
+
+                callback(buffer(block, 0, received))
+
+            # shutdown ssl layer
+            if hasattr(conn, 'unwrap'):
+                conn.unwrap()
+        finally:
+            conn.close()
+
+        return self.connection.voidresp()
+
+
+    # Returns block size for transfers, configured or automatically tuned
+    #
+    # @type self: FTPSConnection
+    #
+    # @return int
+    def __getBlockSize(self):
+        if self.config['transfer_block_size'] > 0:
+            return int(self.config['transfer_block_size'])
+
+        return getBlockSizeTuner(self.config['host'], self.config['port']).getBlockSize()
+
+
+    # Passes a measured transfer to automatic block size tuning
+    #
+    # @type self: FTPSConnection
+    # @type blockSize: int
+    # @type transferred: int
+    # @param transferred: bytes transferred
+    # @type elapsed: float
+    # @param elapsed: duration of the transfer [seconds]
+    def __recordBlockSize(self, blockSize, transferred, elapsed):
+        if self.config['transfer_block_size'] > 0:
+            return
+
+        getBlockSizeTuner(self.config['host'], self.config['port']).record(blockSize, transferred, elapsed)
+
+
+    # Returns whether the error is likely caused by a dropped connection
+    #
+    # @type self: FTPSConnection
+    # @type exception: Exception
+    #
+    # @return boolean
+    #
+    # @global transientErrorCodes
+    def __isTransient(self, exception):
+        if isinstance(exception, EOFError) or isinstance(exception, socket.error):
+            return True
+
+        if isinstance(exception, ftplib.error_temp):
+            code = re_errorCode.search(str(exception))
+
+            if code is not None and int(code.group(0)) in transientErrorCodes:
+                return True
+
+        return self.__isError(exception, 'disconnected') or self.__isError(exception, 'timeout')
+
+
+    # Creates a client of the underlying library
+    #
+    # @type self: FTPSConnection
+    #
+    # @return ftplib.FTP
+    def __createClient(self):
+        if self.config['tls'] is True:
+            return ftplib.FTP_TLS()
+        else:
+            return ftplib.FTP()
+
+
     # Throws exception if closed
     #
     # @type self: FTPSConnection
@@ -474,21 +1853,15 @@ class FTPSConnection(AbstractConnection):
             raise ConnectionClosedException
 
 
-    # Parses string time
-    #
-    # @see http://stackoverflow.com/questions/2443007/ftp-list-format
+    # Returns whether a debug extra is enabled
     #
     # @type self: FTPSConnection
-    # @type: time_val: string
+    # @type name: string
+    # @param name: key of debug_extras in config
     #
-    # @return unix timestamp
-    def __parseTime(self, time_val):
-        if time_val.find(':') is -1:
-            struct = time.strptime(time_val + str(" 00:00"), "%b %d %Y %H:%M")
-        else:
-            struct = time.strptime(str(currentYear) + " " + time_val, "%Y %b %d %H:%M")
-
-        return time.mktime(struct)
+    # @return bool
+    def __isDebugging(self, name):
+        return 'debug_extras' in self.config and self.config['debug_extras'].get(name) is True
 
 
     # Integer code error comparison
@@ -536,18 +1909,21 @@ class FTPSConnection(AbstractConnection):
     # @type self: FTPSConnection
     # @type path: string
     def __ensurePath(self, path, isFolder=False):
+        self.workingDirectory = None
         self.connection.cwd(self.config['path'])
 
         relative = os.path.relpath(path, self.config['path'])
         relative = self._postprocessPath(relative)
 
         folders = relative.split("/")
+        current = self.config['path']
         if 'debug_extras' in self.config and 'print_ensure_folders' in self.config['debug_extras'] and self.config['debug_extras']['print_ensure_folders'] is True:
             print relative, folders
 
         index = 0
         for folder in folders:
             index += 1
+            current = posixpath.join(current, folder)
 
             try:
                 if index < len(folders) or (isFolder and index <= len(folders)):
@@ -565,12 +1941,14 @@ class FTPSConnection(AbstractConnection):
                         else:
                             raise
 
+                    listingCache.add(self.__getEndpoint(), current, Metafile(folder, True, time.time(), 0))
+
                     # move down
                     self.connection.cwd(folder)
                 else:
                     raise
 
-        self.connection.cwd(self.config['path'])
+        self.cwd(self.config['path'])
 
 
 #class SSHConnection():